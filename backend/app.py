@@ -1,12 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response, BackgroundTasks, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import uvicorn
+import asyncio
+import orjson
 import uuid
+import hmac
 from datetime import datetime
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,11 +22,13 @@ from image_detector import ImageDetector
 from audio_detector import AudioDetector
 from evidence_retriever import EvidenceRetriever
 from database import Database
+from model_loader import model_loader
 
 app = FastAPI(
     title="RealityFix API",
     description="Enhanced fake news detection with better accuracy",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -41,6 +47,27 @@ audio_detector = AudioDetector()
 evidence_retriever = EvidenceRetriever()
 database = Database()
 
+def json_body(result: dict) -> bytes:
+    """Serialize a response once; the same bytes go to the client and the database"""
+    return orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+@app.on_event("startup")
+async def startup():
+    """Create the connection pool and schema before the first request"""
+    await database.initialize()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled resources"""
+    await image_detector.aclose()
+    await audio_detector.aclose()
+    await evidence_retriever.aclose()
+    await database.close()
+    model_loader.release_cached_memory()
+
 # Request/Response Models
 class TextAnalysisRequest(BaseModel):
     text: str
@@ -52,6 +79,8 @@ class ImageAnalysisRequest(BaseModel):
 class AudioAnalysisRequest(BaseModel):
     audio_url: str
 
+# Documents the /analyze/* response schema; handlers build plain dicts and
+# serialize them once with orjson for both the response and the database
 class AnalysisResponse(BaseModel):
     score: float
     label: str
@@ -86,8 +115,8 @@ async def root():
         }
     }
 
-@app.post("/analyze/text", response_model=AnalysisResponse)
-async def analyze_text(request: TextAnalysisRequest):
+@app.post("/analyze/text", responses={200: {"model": AnalysisResponse}})
+async def analyze_text(request: TextAnalysisRequest, background: BackgroundTasks):
     """
     Analyze text content with IMPROVED accuracy
     
@@ -106,43 +135,47 @@ async def analyze_text(request: TextAnalysisRequest):
         if request.url:
             print(f"Analyzing content from: {request.url}")
         
-        # Perform IMPROVED analysis
-        analysis_result = await text_detector.analyze(request.text, url=request.url)
-        
-        # Retrieve evidence from trusted sources
-        evidence = await evidence_retriever.search(request.text[:200])
+        # Perform IMPROVED analysis and retrieve evidence from trusted
+        # sources concurrently (the search does not depend on the analysis)
+        analysis_result, evidence = await asyncio.gather(
+            text_detector.analyze(request.text, url=request.url),
+            evidence_retriever.search(request.text[:200])
+        )
         
         # Generate report ID
         report_id = str(uuid.uuid4())
         
         # Prepare response with breakdown
-        response = AnalysisResponse(
-            score=analysis_result['score'],
-            label=analysis_result['label'],
-            confidence=analysis_result['confidence'],
-            evidence=evidence,
-            explanation=analysis_result['explanation'],
-            report_id=report_id,
-            timestamp=datetime.utcnow().isoformat(),
-            breakdown=analysis_result.get('breakdown')  # Include scoring breakdown
-        )
+        response = {
+            'score': float(analysis_result['score']),
+            'label': analysis_result['label'],
+            'confidence': float(analysis_result['confidence']),
+            'evidence': evidence,
+            'explanation': analysis_result['explanation'],
+            'report_id': report_id,
+            'timestamp': datetime.utcnow().isoformat(),
+            'breakdown': analysis_result.get('breakdown')  # Include scoring breakdown
+        }
+        
+        body = json_body(response)
         
-        # Save to database
-        await database.save_report(
+        # Save to database after the response has been sent
+        background.add_task(
+            database.save_report,
             report_id=report_id,
             content_type='text',
             content=request.text[:500],
-            result=response.dict()
+            result_json=body
         )
         
-        return response
+        return json_response(body)
         
     except Exception as e:
         print(f"Analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Text analysis failed: {str(e)}")
 
-@app.post("/analyze/image", response_model=AnalysisResponse)
-async def analyze_image(request: ImageAnalysisRequest):
+@app.post("/analyze/image", responses={200: {"model": AnalysisResponse}})
+async def analyze_image(request: ImageAnalysisRequest, background: BackgroundTasks):
     """Analyze image for AI generation or manipulation"""
     try:
         if not request.image_url:
@@ -151,30 +184,35 @@ async def analyze_image(request: ImageAnalysisRequest):
         analysis_result = await image_detector.analyze(request.image_url)
         report_id = str(uuid.uuid4())
         
-        response = AnalysisResponse(
-            score=analysis_result['score'],
-            label=analysis_result['label'],
-            confidence=analysis_result['confidence'],
-            evidence=[],
-            explanation=analysis_result['explanation'],
-            report_id=report_id,
-            timestamp=datetime.utcnow().isoformat()
-        )
+        response = {
+            'score': float(analysis_result['score']),
+            'label': analysis_result['label'],
+            'confidence': float(analysis_result['confidence']),
+            'evidence': [],
+            'explanation': analysis_result['explanation'],
+            'report_id': report_id,
+            'timestamp': datetime.utcnow().isoformat(),
+            'breakdown': None
+        }
         
-        await database.save_report(
+        body = json_body(response)
+        
+        # Save to database after the response has been sent
+        background.add_task(
+            database.save_report,
             report_id=report_id,
             content_type='image',
             content=request.image_url,
-            result=response.dict()
+            result_json=body
         )
         
-        return response
+        return json_response(body)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image analysis failed: {str(e)}")
 
-@app.post("/analyze/audio", response_model=AnalysisResponse)
-async def analyze_audio(request: AudioAnalysisRequest):
+@app.post("/analyze/audio", responses={200: {"model": AnalysisResponse}})
+async def analyze_audio(request: AudioAnalysisRequest, background: BackgroundTasks):
     """Analyze audio for deepfake detection"""
     try:
         if not request.audio_url:
@@ -183,24 +221,29 @@ async def analyze_audio(request: AudioAnalysisRequest):
         analysis_result = await audio_detector.analyze(request.audio_url)
         report_id = str(uuid.uuid4())
         
-        response = AnalysisResponse(
-            score=analysis_result['score'],
-            label=analysis_result['label'],
-            confidence=analysis_result['confidence'],
-            evidence=[],
-            explanation=analysis_result['explanation'],
-            report_id=report_id,
-            timestamp=datetime.utcnow().isoformat()
-        )
+        response = {
+            'score': float(analysis_result['score']),
+            'label': analysis_result['label'],
+            'confidence': float(analysis_result['confidence']),
+            'evidence': [],
+            'explanation': analysis_result['explanation'],
+            'report_id': report_id,
+            'timestamp': datetime.utcnow().isoformat(),
+            'breakdown': None
+        }
         
-        await database.save_report(
+        body = json_body(response)
+        
+        # Save to database after the response has been sent
+        background.add_task(
+            database.save_report,
             report_id=report_id,
             content_type='audio',
             content=request.audio_url,
-            result=response.dict()
+            result_json=body
         )
         
-        return response
+        return json_response(body)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Audio analysis failed: {str(e)}")
@@ -214,7 +257,7 @@ async def get_report(report_id: str):
         if not report:
             raise HTTPException(status_code=404, detail="Report not found")
         
-        return JSONResponse(content=report)
+        return ORJSONResponse(report)
         
     except HTTPException:
         raise
@@ -236,6 +279,15 @@ async def health_check():
         "improvements": "Enhanced accuracy with multi-signal analysis"
     }
 
+@app.post("/cache/clear")
+async def clear_cache(x_admin_token: Optional[str] = Header(None)):
+    """Drop cached text analyses, e.g. after the domain lists change (admin only)"""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    # Disabled unless ADMIN_TOKEN is set
+    if not admin_token or not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    return {"cleared": text_detector.clear_cache()}
+
 @app.get("/stats")
 async def get_stats():
     """Get system statistics"""
@@ -264,4 +316,14 @@ if __name__ == "__main__":
     print("✓ Multi-signal ensemble approach")
     print("✓ Better misinformation detection")
     print("=" * 50)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Each worker loads its own copy of the models; keep 1 on a single GPU
+    uvicorn.run(
+        "app:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("API_WORKERS", "1")),
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        log_level="warning"
+    )
\ No newline at end of file
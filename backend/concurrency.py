@@ -0,0 +1,127 @@
+"""
+Concurrency helpers - Micro-batching and request coalescing
+Coalesces concurrent requests into a single batched forward pass, and
+identical in-flight requests into a single execution
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bounded pool for blocking model work (decoding, feature extraction, forward
+# passes). Its size caps how many inferences run at once, which keeps
+# concurrent requests from oversubscribing CPU cores or GPU memory.
+INFER_POOL = ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1),
+    thread_name_prefix="inference"
+)
+
+class MicroBatcher:
+    """Collects concurrent submissions within a short window and runs them as one batch"""
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 32, max_wait: float = 0.005, executor=None):
+        """
+        Args:
+            run_batch: Blocking function mapping a list of items to a list of results
+            max_batch: Maximum number of items per batch
+            max_wait: Seconds to wait for more items after the first one arrives
+            executor: Executor run_batch is dispatched to (None = loop default)
+        """
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result from the next batch"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def _ensure_worker(self):
+        """Start the batching loop lazily, detectors are built before the event loop runs"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._loop())
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._run(batch)
+
+    async def _run(self, batch: List):
+        items = [item for item, _ in batch]
+
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, self.run_batch, items)
+        except Exception as e:
+            logger.error(f"Batch execution error: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # A caller may have been cancelled while the batch was running
+            if not future.done():
+                future.set_result(result)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls sharing a key into one execution"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await factory() unless a call for the same key is already running,
+        in which case wait for and share that call's result
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            # Shield so a cancelled follower does not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved even when nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
@@ -4,39 +4,144 @@ Handles all database operations asynchronously
 """
 
 import aiosqlite
-import json
-from typing import Optional, Dict
+import asyncio
+import orjson
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 import logging
+from aiosqlitepool import SQLiteConnectionPool
+from cachetools import TLRUCache
+
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Reports schema; both timestamps default to the UTC time of the insert
+SQL_NOW = "(strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))"
+
+REPORTS_COLUMNS = f"""
+    report_id TEXT PRIMARY KEY,
+    content_type TEXT NOT NULL,
+    content TEXT,
+    result BLOB NOT NULL,
+    created_at TEXT NOT NULL DEFAULT {SQL_NOW},
+    updated_at TEXT NOT NULL DEFAULT {SQL_NOW}
+"""
+
+# Statements are kept as module constants so every call passes the identical
+# string and hits the per-connection prepared statement cache
+SQL_SAVE_REPORT = """
+    INSERT INTO reports (report_id, content_type, content, result)
+    VALUES (?, ?, ?, ?)
+"""
+
+SQL_GET_REPORT = """
+    SELECT report_id, content_type, content, result, created_at, updated_at
+    FROM reports WHERE report_id = ?
+"""
+
+SQL_ADD_USER_FLAG = """
+    INSERT INTO user_flags (report_id, flag_type, comment, created_at)
+    VALUES (?, ?, ?, ?)
+"""
+
+SQL_GET_CACHE = """
+    SELECT cache_value, expires_at FROM cache
+    WHERE cache_key = ?
+"""
+
+SQL_SET_CACHE = """
+    INSERT OR REPLACE INTO cache (cache_key, cache_value, created_at, expires_at)
+    VALUES (?, ?, ?, ?)
+"""
+
+# Report results are stored zstd-compressed; repeated JSON keys compress well
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_CCTX = zstd.ZstdCompressor(level=3) if ZSTD_AVAILABLE else None
+_DCTX = zstd.ZstdDecompressor() if ZSTD_AVAILABLE else None
+
+def _pack_result(result_json: bytes) -> bytes:
+    """Compress a serialized result for storage"""
+    if _CCTX is None:
+        return result_json
+    return _CCTX.compress(result_json)
+
+def _unpack_result(blob) -> Optional[bytes]:
+    """Inverse of _pack_result; rows written before compression hold plain JSON"""
+    if isinstance(blob, bytes) and blob[:4] == ZSTD_MAGIC:
+        if _DCTX is None:
+            logger.error("Stored result is zstd-compressed but zstandard is not installed")
+            return None
+        return _DCTX.decompress(blob)
+    return blob
+
+def _cache_ttu(_key, value, _now) -> float:
+    """Expiry (epoch seconds) of an in-memory cache entry"""
+    expires = value[1]
+    return expires if expires is not None else float('inf')
+
 class Database:
     """Manages SQLite database operations"""
     
-    def __init__(self, db_path: str = "realityfix.db"):
+    # In-process tier in front of the cache table
+    MEM_CACHE_SIZE = 4096
+    # Entries living this long or less are kept in memory only
+    PERSIST_MIN_TTL = 60
+    
+    def __init__(self, db_path: str = "realityfix.db", pool_size: Optional[int] = None):
         self.db_path = db_path
+        self.pool_size = pool_size or min(32, (os.cpu_count() or 1) * 4)
+        self.pool = None
+        # Serializes writers so pooled connections don't contend for the
+        # WAL write lock; created in initialize() on the running loop
+        self._write_lock = None
+        # Guards against concurrent first calls each creating the schema
+        self._init_lock = None
+        # cache_key -> (cache_value, expires at in epoch seconds or None)
+        self._mem_cache = TLRUCache(maxsize=self.MEM_CACHE_SIZE, ttu=_cache_ttu, timer=time.time)
         self._initialized = False
     
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open a pooled connection with WAL, a larger page cache and a busy timeout"""
+        conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        await conn.execute("PRAGMA cache_size=-64000")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        await conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+    
     async def initialize(self):
         """Initialize database and create tables"""
         if self._initialized:
             return
         
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        
+        async with self._init_lock:
+            if not self._initialized:
+                await self._initialize()
+    
+    async def _initialize(self):
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Create reports table
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS reports (
-                        report_id TEXT PRIMARY KEY,
-                        content_type TEXT NOT NULL,
-                        content TEXT,
-                        result TEXT NOT NULL,
-                        created_at TEXT NOT NULL,
-                        updated_at TEXT NOT NULL
-                    )
-                """)
+            if self.pool is None:
+                self.pool = SQLiteConnectionPool(self._connect, pool_size=self.pool_size)
+            if self._write_lock is None:
+                self._write_lock = asyncio.Lock()
+            
+            async with self.pool.connection() as db:
+                # Create reports table (timestamps are filled in by SQLite)
+                await db.execute(f"CREATE TABLE IF NOT EXISTS reports ({REPORTS_COLUMNS})")
+                await self._migrate_report_timestamps(db)
                 
                 # Create user flags table
                 await db.execute("""
@@ -50,15 +155,16 @@ class Database:
                     )
                 """)
                 
-                # Create cache table
+                # Create cache table (expires_at in unix epoch seconds)
                 await db.execute("""
                     CREATE TABLE IF NOT EXISTS cache (
                         cache_key TEXT PRIMARY KEY,
                         cache_value TEXT NOT NULL,
                         created_at TEXT NOT NULL,
-                        expires_at TEXT
+                        expires_at INTEGER
                     )
                 """)
+                await self._migrate_cache_expiry(db)
                 
                 # Create indexes
                 await db.execute("""
@@ -80,8 +186,73 @@ class Database:
             logger.error(f"Database initialization error: {e}")
             raise
     
+    async def _migrate_report_timestamps(self, db: aiosqlite.Connection):
+        """Rebuild a reports table created before timestamps had SQL defaults"""
+        async with db.execute("PRAGMA table_info(reports)") as cursor:
+            defaults = {row[1]: row[4] for row in await cursor.fetchall()}
+        
+        if defaults.get('created_at') is not None:
+            return
+        
+        # Copy, drop, then rename so user_flags keeps referencing "reports"
+        async with self._migration(db):
+            await db.execute("DROP INDEX IF EXISTS idx_reports_created")
+            await db.execute("DROP TABLE IF EXISTS reports_new")
+            await db.execute(f"CREATE TABLE reports_new ({REPORTS_COLUMNS})")
+            await db.execute("""
+                INSERT INTO reports_new (report_id, content_type, content, result, created_at, updated_at)
+                SELECT report_id, content_type, content, result, created_at, updated_at FROM reports
+            """)
+            await db.execute("DROP TABLE reports")
+            await db.execute("ALTER TABLE reports_new RENAME TO reports")
+        logger.info("Migrated reports timestamps to SQL defaults")
+    
+    async def _migrate_cache_expiry(self, db: aiosqlite.Connection):
+        """Convert a cache table with ISO-8601 TEXT expiries to epoch INTEGER"""
+        async with db.execute("PRAGMA table_info(cache)") as cursor:
+            columns = {row[1]: row[2] for row in await cursor.fetchall()}
+        
+        if columns.get('expires_at', '').upper() != 'TEXT':
+            return
+        
+        # The column affinity can't be altered in place, rebuild the table
+        async with self._migration(db):
+            await db.execute("DROP TABLE IF EXISTS cache_old")
+            await db.execute("ALTER TABLE cache RENAME TO cache_old")
+            await db.execute("""
+                CREATE TABLE cache (
+                    cache_key TEXT PRIMARY KEY,
+                    cache_value TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    expires_at INTEGER
+                )
+            """)
+            await db.execute("""
+                INSERT INTO cache (cache_key, cache_value, created_at, expires_at)
+                SELECT cache_key, cache_value, created_at, CAST(strftime('%s', expires_at) AS INTEGER)
+                FROM cache_old
+            """)
+            await db.execute("DROP TABLE cache_old")
+        logger.info("Migrated cache.expires_at to epoch seconds")
+    
+    @asynccontextmanager
+    async def _migration(self, db: aiosqlite.Connection):
+        """
+        Run a table rebuild in one explicit transaction. sqlite3 would otherwise
+        autocommit each DDL statement, and a crash midway would leave a
+        half-migrated schema that fails on every later startup.
+        """
+        await db.commit()
+        await db.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+    
     async def save_report(self, report_id: str, content_type: str, 
-                         content: str, result: Dict) -> bool:
+                         content: str, result_json: bytes) -> bool:
         """
         Save analysis report to database
         
@@ -89,22 +260,19 @@ class Database:
             report_id: Unique report identifier
             content_type: Type of content (text, image, audio)
             content: Original content or URL
-            result: Analysis result dictionary
+            result_json: Analysis result, already serialized to JSON
             
         Returns:
             True if successful, False otherwise
         """
         try:
-            await self.initialize()
+            if not self._initialized:
+                await self.initialize()
             
-            now = datetime.utcnow().isoformat()
-            result_json = json.dumps(result)
+            blob = _pack_result(result_json)
             
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute("""
-                    INSERT INTO reports (report_id, content_type, content, result, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (report_id, content_type, content, result_json, now, now))
+            async with self._write_lock, self.pool.connection() as db:
+                await db.execute(SQL_SAVE_REPORT, (report_id, content_type, content, blob))
                 
                 await db.commit()
             
@@ -115,6 +283,41 @@ class Database:
             logger.error(f"Failed to save report: {e}")
             return False
     
+    async def save_reports(self, reports: List[Tuple]) -> bool:
+        """
+        Save many analysis reports in a single transaction
+        
+        Args:
+            reports: (report_id, content_type, content, result_json) tuples
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not reports:
+            return True
+        
+        try:
+            if not self._initialized:
+                await self.initialize()
+            
+            # Compress before taking the write lock
+            rows = [
+                (report_id, content_type, content, _pack_result(result_json))
+                for report_id, content_type, content, result_json in reports
+            ]
+            
+            async with self._write_lock, self.pool.connection() as db:
+                await db.executemany(SQL_SAVE_REPORT, rows)
+                
+                await db.commit()
+            
+            logger.info(f"Saved {len(rows)} report(s)")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to save reports: {e}")
+            return False
+    
     async def get_report(self, report_id: str) -> Optional[Dict]:
         """
         Retrieve report by ID
@@ -126,24 +329,25 @@ class Database:
             Report dictionary or None if not found
         """
         try:
-            await self.initialize()
+            if not self._initialized:
+                await self.initialize()
             
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                
-                async with db.execute("""
-                    SELECT * FROM reports WHERE report_id = ?
-                """, (report_id,)) as cursor:
+            async with self.pool.connection() as db:
+                async with db.execute(SQL_GET_REPORT, (report_id,)) as cursor:
                     row = await cursor.fetchone()
                     
                     if row:
+                        report_id, content_type, content, result, created_at, updated_at = row
+                        result = _unpack_result(result)
+                        if result is None:
+                            return None
                         return {
-                            'report_id': row['report_id'],
-                            'content_type': row['content_type'],
-                            'content': row['content'],
-                            'result': json.loads(row['result']),
-                            'created_at': row['created_at'],
-                            'updated_at': row['updated_at']
+                            'report_id': report_id,
+                            'content_type': content_type,
+                            'content': content,
+                            'result': orjson.loads(result),
+                            'created_at': created_at,
+                            'updated_at': updated_at
                         }
             
             return None
@@ -165,20 +369,34 @@ class Database:
         Returns:
             True if successful, False otherwise
         """
+        return await self.add_user_flags([(report_id, flag_type, comment)])
+    
+    async def add_user_flags(self, flags: List[Tuple]) -> bool:
+        """
+        Add many user flags in a single transaction
+        
+        Args:
+            flags: (report_id, flag_type, comment) tuples
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not flags:
+            return True
+        
         try:
-            await self.initialize()
+            if not self._initialized:
+                await self.initialize()
             
             now = datetime.utcnow().isoformat()
+            rows = [(report_id, flag_type, comment, now) for report_id, flag_type, comment in flags]
             
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute("""
-                    INSERT INTO user_flags (report_id, flag_type, comment, created_at)
-                    VALUES (?, ?, ?, ?)
-                """, (report_id, flag_type, comment, now))
+            async with self._write_lock, self.pool.connection() as db:
+                await db.executemany(SQL_ADD_USER_FLAG, rows)
                 
                 await db.commit()
             
-            logger.info(f"Flag added to report: {report_id}")
+            logger.info(f"Added {len(rows)} flag(s)")
             return True
             
         except Exception as e:
@@ -195,24 +413,29 @@ class Database:
         Returns:
             Cached value or None
         """
+        entry = self._mem_cache.get(cache_key)
+        if entry is not None:
+            return entry[0]
+        
         try:
-            await self.initialize()
+            if not self._initialized:
+                await self.initialize()
             
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute("""
-                    SELECT cache_value, expires_at FROM cache 
-                    WHERE cache_key = ?
-                """, (cache_key,)) as cursor:
+            async with self.pool.connection() as db:
+                async with db.execute(SQL_GET_CACHE, (cache_key,)) as cursor:
                     row = await cursor.fetchone()
                     
                     if row:
                         cache_value, expires_at = row
+                        expires = None
                         
                         # Check expiration
                         if expires_at:
-                            if datetime.fromisoformat(expires_at) < datetime.utcnow():
+                            if expires_at < time.time():
                                 return None
+                            expires = expires_at
                         
+                        self._mem_cache[cache_key] = (cache_value, expires)
                         return cache_value
             
             return None
@@ -234,22 +457,46 @@ class Database:
         Returns:
             True if successful, False otherwise
         """
-        try:
-            await self.initialize()
+        return await self.set_cache_many([(cache_key, cache_value, ttl_seconds)])
+    
+    async def set_cache_many(self, entries: List[Tuple]) -> bool:
+        """
+        Set many cached values in a single transaction
+        
+        Args:
+            entries: (cache_key, cache_value, ttl_seconds) tuples
             
+        Returns:
+            True if successful, False otherwise
+        """
+        if not entries:
+            return True
+        
+        try:
             now = datetime.utcnow()
             created_at = now.isoformat()
-            expires_at = None
+            epoch = time.time()
+            rows = []
             
-            if ttl_seconds:
-                from datetime import timedelta
-                expires_at = (now + timedelta(seconds=ttl_seconds)).isoformat()
+            for cache_key, cache_value, ttl_seconds in entries:
+                expires_at = None
+                if ttl_seconds:
+                    self._mem_cache[cache_key] = (cache_value, epoch + ttl_seconds)
+                    if ttl_seconds <= self.PERSIST_MIN_TTL:
+                        continue
+                    expires_at = int(epoch + ttl_seconds)
+                else:
+                    self._mem_cache[cache_key] = (cache_value, None)
+                rows.append((cache_key, cache_value, created_at, expires_at))
             
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute("""
-                    INSERT OR REPLACE INTO cache (cache_key, cache_value, created_at, expires_at)
-                    VALUES (?, ?, ?, ?)
-                """, (cache_key, cache_value, created_at, expires_at))
+            if not rows:
+                return True
+            
+            if not self._initialized:
+                await self.initialize()
+            
+            async with self._write_lock, self.pool.connection() as db:
+                await db.executemany(SQL_SET_CACHE, rows)
                 
                 await db.commit()
             
@@ -262,13 +509,22 @@ class Database:
     async def health_check(self) -> bool:
         """Check database health"""
         try:
-            await self.initialize()
+            if not self._initialized:
+                await self.initialize()
             
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.connection() as db:
                 await db.execute("SELECT 1")
             
             return True
             
         except Exception as e:
             logger.error(f"Database health check failed: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    async def close(self):
+        """Close all pooled connections"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+        self._write_lock = None
+        self._initialized = False
\ No newline at end of file
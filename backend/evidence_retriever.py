@@ -4,18 +4,31 @@ Uses web search APIs to find relevant articles from reliable outlets
 """
 
 import httpx
-from typing import List, Dict
+import os
+import re
+from html import unescape
+from typing import List, Dict, Optional
 import logging
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlparse, parse_qs
+from cachetools import TTLCache
+
+try:
+    from selectolax.parser import HTMLParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    SELECTOLAX_AVAILABLE = False
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fallback link extraction when selectolax is not installed
+_HREF_RE = re.compile(r'<a\s[^>]*?href=["\']([^"\']+)["\']', re.IGNORECASE)
+
 class EvidenceRetriever:
     """Retrieves evidence from trusted news sources"""
     
     # Trusted sources for fact-checking
-    TRUSTED_SOURCES = [
+    TRUSTED_SOURCES = frozenset([
         'bbc.com',
         'reuters.com',
         'apnews.com',
@@ -23,10 +36,26 @@ class EvidenceRetriever:
         'factcheck.org',
         'snopes.com',
         'politifact.com'
-    ]
+    ])
+    
+    CACHE_SIZE = 1024
+    # Seconds search results are reused before searching again
+    CACHE_TTL = int(os.getenv('CACHE_TTL', '3600'))
     
     def __init__(self):
         self.timeout = 10.0
+        # (query, max_results) -> tuple of evidence dicts, copied on the way out
+        self._cache = TTLCache(maxsize=self.CACHE_SIZE, ttl=self.CACHE_TTL)
+        # One long-lived client so searches reuse TCP/TLS connections
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60),
+            http2=True
+        )
+    
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self._client.aclose()
     
     async def search(self, query: str, max_results: int = 3) -> List[Dict]:
         """
@@ -39,10 +68,18 @@ class EvidenceRetriever:
         Returns:
             List of evidence dictionaries with url, source, and snippet
         """
+        key = (query, max_results)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return [dict(item) for item in cached]
+        
         try:
             # For MVP, use a simple mock search
             # In production, integrate with Bing API, Google Custom Search, or News API
             evidence = await self._mock_search(query, max_results)
+            # An empty result may be a transient search failure; retry next time
+            if evidence:
+                self._cache[key] = tuple(dict(item) for item in evidence)
             return evidence
             
         except Exception as e:
@@ -84,29 +121,62 @@ class EvidenceRetriever:
         try:
             search_url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(search_url)
-                response.raise_for_status()
-                
-                # Parse results (simplified for MVP)
-                # In production, use proper HTML parsing
-                evidence = []
-                
-                # Filter for trusted sources
-                for source in self.TRUSTED_SOURCES:
-                    if source in response.text and len(evidence) < max_results:
-                        evidence.append({
-                            'url': f'https://{source}',
-                            'source': source.split('.')[0].upper(),
-                            'snippet': f'Related information from {source}'
-                        })
-                
-                return evidence
+            response = await self._client.get(search_url)
+            response.raise_for_status()
+            
+            evidence = []
+            seen = set()
+            
+            # Keep result links pointing at trusted sources, one per source
+            for link in self._extract_links(response.text):
+                source = self._trusted_source(urlparse(link).hostname)
+                if source is None or source in seen:
+                    continue
+                seen.add(source)
+                evidence.append({
+                    'url': link,
+                    'source': source.split('.')[0].upper(),
+                    'snippet': f'Related information from {source}'
+                })
+                if len(evidence) >= max_results:
+                    break
+            
+            return evidence
                 
         except Exception as e:
             logger.error(f"Real search error: {e}")
             return []
     
+    def _extract_links(self, html: str) -> List[str]:
+        """Parse the page once and return its anchor targets, unwrapping DuckDuckGo redirects"""
+        if SELECTOLAX_AVAILABLE:
+            hrefs = [node.attributes.get('href') or '' for node in HTMLParser(html).css('a[href]')]
+        else:
+            hrefs = [unescape(href) for href in _HREF_RE.findall(html)]
+        
+        links = []
+        for href in hrefs:
+            parsed = urlparse(href)
+            # Result links look like //duckduckgo.com/l/?uddg=<target>
+            if parsed.path == '/l/':
+                target = parse_qs(parsed.query).get('uddg')
+                if target:
+                    href = target[0]
+            links.append(href)
+        return links
+    
+    def _trusted_source(self, hostname: Optional[str]) -> Optional[str]:
+        """Trusted source matching a hostname or one of its parent domains"""
+        if not hostname:
+            return None
+        # One set lookup per domain level: news.bbc.co.uk, bbc.co.uk, co.uk, uk
+        parts = hostname.lower().split('.')
+        for i in range(len(parts)):
+            suffix = '.'.join(parts[i:])
+            if suffix in self.TRUSTED_SOURCES:
+                return suffix
+        return None
+    
     def validate_source(self, url: str) -> bool:
         """
         Validate if a source is trusted
@@ -117,4 +187,11 @@ class EvidenceRetriever:
         Returns:
             True if source is trusted, False otherwise
         """
-        return any(source in url.lower() for source in self.TRUSTED_SOURCES)
\ No newline at end of file
+        # Accept bare domains like "bbc.com/news" as well as full URLs
+        if '//' not in url:
+            url = '//' + url
+        try:
+            hostname = urlparse(url).hostname
+        except ValueError:
+            return False
+        return self._trusted_source(hostname) is not None
\ No newline at end of file
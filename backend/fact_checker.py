@@ -4,7 +4,8 @@ Free API for checking against verified fact-check databases
 """
 
 import logging
-import requests
+import re
+import httpx
 from typing import Dict, List, Optional
 import os
 
@@ -13,10 +14,20 @@ logger = logging.getLogger(__name__)
 class FactChecker:
     """Check claims against Google's Fact Check database"""
     
+    # Rating keywords, matched as substrings of the lowercased textual rating
+    _DEBUNK_RE = re.compile(r"false|misleading|pants on fire|incorrect")
+    _VERIFY_RE = re.compile(r"true|correct|accurate")
+    
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_FACTCHECK_API_KEY') or os.getenv('GEMINI_API_KEY')
         self.base_url = "https://factchecktools.googleapis.com/v1alpha1/claims:search"
         self.enabled = bool(self.api_key)
+        # Shared client so lookups reuse connections and never block the event loop
+        self._client = httpx.AsyncClient(
+            timeout=5.0,
+            limits=httpx.Limits(max_keepalive_connections=20),
+            http2=True
+        )
         
         if self.enabled:
             logger.info("Fact Check API initialized")
@@ -27,7 +38,11 @@ class FactChecker:
         """Check if API is configured"""
         return self.enabled
     
-    def check_claims(self, text: str, url: Optional[str] = None) -> Optional[Dict]:
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self._client.aclose()
+    
+    async def check_claims(self, text: str, url: Optional[str] = None) -> Optional[Dict]:
         """
         Search for fact-checks related to the text
         
@@ -52,7 +67,7 @@ class FactChecker:
                 'pageSize': 5  # Get top 5 results
             }
             
-            response = requests.get(self.base_url, params=params, timeout=5)
+            response = await self._client.get(self.base_url, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -102,10 +117,10 @@ class FactChecker:
                 found_checks.append(check_info)
                 
                 # Count debunked vs verified
-                if any(word in rating for word in ['false', 'misleading', 'pants on fire', 'incorrect']):
+                if self._DEBUNK_RE.search(rating):
                     debunked_count += 1
                     warnings.append(f"Claim '{claim_text[:50]}...' rated as {rating} by {publisher}")
-                elif any(word in rating for word in ['true', 'correct', 'accurate']):
+                elif self._VERIFY_RE.search(rating):
                     verified_count += 1
         
         return {
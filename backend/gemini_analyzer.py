@@ -4,20 +4,54 @@ Uses Gemini 1.5 Flash (free tier) for deep content verification
 """
 
 import os
+import asyncio
 import json
+import orjson
 import logging
 from typing import Dict, Optional, List
 import google.generativeai as genai
 
 logger = logging.getLogger(__name__)
 
+# Static parts of the analysis prompt, built once
+_PROMPT_PREFIX = """You are an expert fact-checker and misinformation analyst. Analyze this article for credibility and potential misinformation.
+"""
+
+_PROMPT_SUFFIX = """Provide your analysis in the following JSON format:
+{
+    "credibility_score": <float 0-1, where 1=highly credible, 0=likely false>,
+    "claims": [<list of main factual claims made in the article>],
+    "red_flags": [<list of concerning patterns: clickbait, emotional manipulation, unsourced claims, logical fallacies, etc.>],
+    "reasoning": "<concise explanation of your credibility assessment>",
+    "bias_detected": "<political/commercial bias if present, or 'none'>",
+    "verification_needed": [<specific claims that should be fact-checked>]
+}
+
+Focus on:
+1. Verifiable facts vs. opinions/speculation
+2. Source citations and evidence quality
+3. Logical consistency and reasoning
+4. Emotional manipulation tactics
+5. Clickbait or sensationalist language
+6. Missing context or cherry-picked data
+
+Return ONLY the JSON, no other text."""
+
 class GeminiAnalyzer:
     """Analyze text using Google Gemini API for advanced fact-checking"""
     
+    # Shared decoder; raw_decode parses the first JSON object and ignores trailing text
+    _decoder = json.JSONDecoder()
+    
+    # In-flight requests allowed against the (single, process-wide) API key
+    MAX_CONCURRENT = 4
+    
     def __init__(self):
         self.api_key = os.getenv('GEMINI_API_KEY')
         self.model = None
         self.enabled = False
+        # Created on first use inside the running loop
+        self._sem = None
         
         if self.api_key:
             try:
@@ -53,14 +87,18 @@ class GeminiAnalyzer:
         try:
             prompt = self._build_analysis_prompt(text, url)
             
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.1,  # Low temp for consistency
-                    'top_p': 0.8,
-                    'max_output_tokens': 1024,
-                }
-            )
+            if self._sem is None:
+                self._sem = asyncio.Semaphore(self.MAX_CONCURRENT)
+            
+            async with self._sem:
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config={
+                        'temperature': 0.1,  # Low temp for consistency
+                        'top_p': 0.8,
+                        'max_output_tokens': 1024,
+                    }
+                )
             
             # Parse structured response
             result = self._parse_response(response.text)
@@ -80,46 +118,22 @@ class GeminiAnalyzer:
         
         url_context = f"\nSource URL: {url}" if url else ""
         
-        prompt = f"""You are an expert fact-checker and misinformation analyst. Analyze this article for credibility and potential misinformation.
-{url_context}
-
-ARTICLE TEXT:
-{text}
-
-Provide your analysis in the following JSON format:
-{{
-    "credibility_score": <float 0-1, where 1=highly credible, 0=likely false>,
-    "claims": [<list of main factual claims made in the article>],
-    "red_flags": [<list of concerning patterns: clickbait, emotional manipulation, unsourced claims, logical fallacies, etc.>],
-    "reasoning": "<concise explanation of your credibility assessment>",
-    "bias_detected": "<political/commercial bias if present, or 'none'>",
-    "verification_needed": [<specific claims that should be fact-checked>]
-}}
-
-Focus on:
-1. Verifiable facts vs. opinions/speculation
-2. Source citations and evidence quality
-3. Logical consistency and reasoning
-4. Emotional manipulation tactics
-5. Clickbait or sensationalist language
-6. Missing context or cherry-picked data
-
-Return ONLY the JSON, no other text."""
-
-        return prompt
+        return "".join((_PROMPT_PREFIX, url_context, "\n\nARTICLE TEXT:\n", text, "\n\n", _PROMPT_SUFFIX))
     
     def _parse_response(self, response_text: str) -> Dict:
         """Parse Gemini's JSON response"""
         try:
             # Extract JSON from response (in case there's extra text)
             start = response_text.find('{')
-            end = response_text.rfind('}') + 1
             
-            if start == -1 or end == 0:
+            if start == -1:
                 raise ValueError("No JSON found in response")
             
-            json_str = response_text[start:end]
-            result = json.loads(json_str)
+            try:
+                result = orjson.loads(response_text[start:])
+            except orjson.JSONDecodeError:
+                # Strict parse failed (trailing text or fences), take the first object
+                result, _ = self._decoder.raw_decode(response_text, start)
             
             # Validate required fields
             required = ['credibility_score', 'claims', 'red_flags', 'reasoning']
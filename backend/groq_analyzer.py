@@ -4,45 +4,61 @@ Uses Llama 3.3 via Groq's ultra-fast API for credibility analysis
 """
 
 import os
+import asyncio
+import itertools
 import json
+import orjson
 import logging
 from typing import Dict, Optional, List
-from groq import Groq
+from groq import AsyncGroq
+from dotenv import load_dotenv
+
+# Pick up backend/.env once at import, also when used outside app.py
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 class GroqAnalyzer:
+    # Shared decoder; raw_decode parses the first JSON object and ignores trailing text
+    _decoder = json.JSONDecoder()
+    
+    # In-flight requests allowed per API key
+    MAX_CONCURRENT_PER_KEY = 4
+    
     def __init__(self):
-        self.api_key = os.getenv('GROQ_API_KEY')
+        # GROQ_API_KEYS takes a comma separated list to spread load over keys
+        keys = [k.strip() for k in os.getenv('GROQ_API_KEYS', '').split(',') if k.strip()]
+        if not keys and os.getenv('GROQ_API_KEY'):
+            keys = [os.getenv('GROQ_API_KEY')]
+        self.api_key = keys[0] if keys else None
         
-        # Fallback: Try to read from .env manually if not found
-        if not self.api_key:
-            try:
-                env_path = os.path.join(os.path.dirname(__file__), '.env')
-                if os.path.exists(env_path):
-                    with open(env_path, 'r') as f:
-                        for line in f:
-                            if line.strip().startswith('GROQ_API_KEY='):
-                                self.api_key = line.strip().split('=', 1)[1].strip()
-                                logger.info("Loaded GROQ_API_KEY from .env manually")
-                                break
-            except Exception as e:
-                logger.warning(f"Manual .env load failed: {e}")
-
         self.client = None
+        self._clients: List = []
+        # Per-client semaphores, created on first use inside the running loop
+        self._sems: Optional[List[asyncio.Semaphore]] = None
+        self._next = itertools.count()
         self.model = "llama-3.3-70b-versatile"  # High performance model
         
-        if self.api_key:
+        if keys:
             try:
-                self.client = Groq(api_key=self.api_key)
-                logger.info(f"Groq API initialized with model: {self.model}")
+                self._clients = [AsyncGroq(api_key=key) for key in keys]
+                self.client = self._clients[0]
+                logger.info(f"Groq API initialized with model: {self.model} ({len(keys)} key(s))")
             except Exception as e:
                 logger.warning(f"Failed to initialize Groq API: {e}")
+                self._clients = []
         else:
             logger.warning("GROQ_API_KEY not found in environment variables")
 
     def is_available(self) -> bool:
         return self.client is not None
+    
+    def _acquire_client(self):
+        """Next client in round-robin order with its concurrency semaphore"""
+        if self._sems is None:
+            self._sems = [asyncio.Semaphore(self.MAX_CONCURRENT_PER_KEY) for _ in self._clients]
+        i = next(self._next) % len(self._clients)
+        return self._clients[i], self._sems[i]
 
     async def analyze_credibility(self, text: str, url: Optional[str] = None) -> Optional[Dict]:
         """
@@ -53,17 +69,19 @@ class GroqAnalyzer:
 
         try:
             prompt = self._build_prompt(text, url)
+            client, sem = self._acquire_client()
             
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert fact-checker and media literacy analyst. Analyze the given text for credibility, bias, and factual accuracy. Return ONLY valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=1024,
-                response_format={"type": "json_object"}
-            )
+            async with sem:
+                completion = await client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "You are an expert fact-checker and media literacy analyst. Analyze the given text for credibility, bias, and factual accuracy. Return ONLY valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.1,
+                    max_tokens=1024,
+                    response_format={"type": "json_object"}
+                )
             
             response_text = completion.choices[0].message.content
             return self._parse_response(response_text)
@@ -91,10 +109,17 @@ class GroqAnalyzer:
 
     def _parse_response(self, response_text: str) -> Optional[Dict]:
         try:
-            # Clean up potential markdown code blocks
-            clean_text = response_text.replace('```json', '').replace('```', '').strip()
-            return json.loads(clean_text)
-        except json.JSONDecodeError:
+            # Skip potential markdown code fences around the object
+            start = response_text.find('{')
+            if start == -1:
+                raise ValueError("No JSON found in response")
+            try:
+                result = orjson.loads(response_text[start:])
+            except orjson.JSONDecodeError:
+                # Strict parse failed (trailing text or fences), take the first object
+                result, _ = self._decoder.raw_decode(response_text, start)
+            return result
+        except ValueError:
             logger.error(f"Failed to parse Groq JSON response: {response_text[:100]}...")
             return None
 
@@ -3,12 +3,17 @@ Image Detector - Analyzes images for AI generation and manipulation
 Uses pretrained models and image forensics techniques
 """
 
+import asyncio
+import hashlib
 import logging
+import os
+import threading
 import httpx
 from PIL import Image
 from io import BytesIO
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from model_loader import model_loader
+from concurrency import INFER_POOL, MicroBatcher, SingleFlight
 
 # Robust imports
 try:
@@ -22,45 +27,172 @@ except ImportError:
     np = None
     transforms = None
 
+try:
+    from torchvision.io import decode_image, decode_jpeg, ImageReadMode
+    TORCHVISION_IO_AVAILABLE = True
+except ImportError:
+    TORCHVISION_IO_AVAILABLE = False
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pixel values and their squares, for moments computed from a histogram
+_LEVELS = np.arange(256, dtype=np.float64) if ML_AVAILABLE else None
+_LEVELS_SQ = _LEVELS * _LEVELS if ML_AVAILABLE else None
+
+# Score thresholds and the label of each bucket they delimit
+_LABEL_BOUNDARIES = torch.tensor([0.4, 0.7]) if ML_AVAILABLE else None
+_LABELS = ("misinformation", "suspicious", "trustworthy")
+
 class ImageDetector:
     """Detects AI-generated or manipulated images"""
     
+    # Batches allowed to be decoding/preprocessing at once; extra requests
+    # wait here instead of piling up (with their payloads) in the pool queue
+    MAX_PENDING_BATCHES = 8
+    
+    # Concurrent single-image analyses are coalesced into one forward pass
+    MAX_BATCH = int(os.getenv('IMAGE_MAX_BATCH', '32'))
+    BATCH_WINDOW = float(os.getenv('IMAGE_BATCH_WAIT_MS', '5')) / 1000.0  # seconds
+    
+    # "torch" (default) or "onnx" to run ResNet18 through ONNX Runtime
+    BACKEND = os.getenv('IMAGE_BACKEND', 'torch').lower()
+    
     def __init__(self):
         self.model = None
+        self._onnx = False
+        self._compiled = False
+        # Captured CUDA graphs by batch size, used when torch.compile is unavailable
+        self._graphs = {}
+        self._graphs_enabled = False
+        self._graph_lock = threading.Lock()
+        # Inference dtype, float16 when the model runs on CUDA
+        self._dtype = None
         self.transform = self._get_transform()
-        self._load_model()
+        # Concurrent requests for the same URL share one analysis
+        self._inflight = SingleFlight()
+        self._batcher = MicroBatcher(
+            self._score_batch,
+            max_batch=self.MAX_BATCH,
+            max_wait=self.BATCH_WINDOW,
+            executor=INFER_POOL
+        )
+        # One long-lived client so downloads reuse TCP/TLS connections
+        self._client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=256),
+            http2=True
+        )
+        # The model is loaded on first use, workers that never see an image
+        # request don't pay for it; created lazily inside the running loop
+        self._load_lock = None
+        self._load_attempted = False
+        self._pending = None
+        # Per-thread pinned staging buffers for host to device copies
+        self._staging = threading.local()
+    
+    async def _ensure_model(self):
+        """Load the model once, off the event loop, on the first analysis"""
+        if self._load_attempted:
+            return
+        
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        
+        async with self._load_lock:
+            if not self._load_attempted:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(INFER_POOL, self._load_model)
+                self._load_attempted = True
     
     def _load_model(self):
         """Load pretrained image classification model"""
         try:
+            if self.BACKEND == "onnx":
+                self.model = model_loader.load_image_onnx_session()
+                if self.model:
+                    self._onnx = True
+                    self._dtype = torch.float32
+                    logger.info("Image detector initialized with ONNX Runtime")
+                    return
+                logger.warning("ONNX image backend unavailable, using PyTorch")
+            
             self.model = model_loader.load_image_model()
             if self.model:
+                self._dtype = torch.float16 if model_loader.get_device() == "cuda" else torch.float32
+                self.model = self._compile_model(self.model)
+                # reduce-overhead compilation already replays CUDA graphs
+                self._graphs_enabled = (
+                    not self._compiled
+                    and model_loader.get_device() == "cuda"
+                    and hasattr(torch.cuda, 'CUDAGraph')
+                )
                 logger.info("Image detector initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize image detector: {e}")
             self.model = None
     
+    def _compile_model(self, model):
+        """
+        Compile the forward pass with TorchDynamo, specialized for
+        (N, 3, 224, 224) inputs, and warm it up so kernels are built at load
+        """
+        if not hasattr(torch, 'compile'):
+            return model
+        
+        try:
+            compiled = torch.compile(model, mode="reduce-overhead", fullgraph=True, dynamic=False)
+            device = model_loader.get_device()
+            example = torch.zeros(1, 3, 224, 224, dtype=self._dtype, device=device)
+            with torch.inference_mode():
+                # Second call runs the captured graph
+                compiled(example)
+                compiled(example)
+            self._compiled = True
+            return compiled
+        except Exception as e:
+            logger.warning(f"torch.compile failed for image model, using eager mode: {e}")
+            return model
+    
     def _get_transform(self):
-        """Get image preprocessing transform"""
+        """
+        Get image preprocessing transform. Operates on uint8 CHW tensors so it
+        can run on the model device instead of through PIL on the CPU.
+        """
         if not ML_AVAILABLE:
             return None
             
-        return transforms.Compose([
-            transforms.Resize(256),
+        pipeline = torch.nn.Sequential(
+            transforms.Resize(256, antialias=True),
             transforms.CenterCrop(224),
-            transforms.ToTensor(),
+            transforms.ConvertImageDtype(torch.float32),
             transforms.Normalize(
                 mean=[0.485, 0.456, 0.406],
                 std=[0.229, 0.224, 0.225]
             )
-        ])
+        )
+        
+        # Script the chain into one TorchScript module: no per-step Python
+        # dispatch, and the fuser can merge the elementwise dtype/normalize ops
+        try:
+            return torch.jit.script(pipeline)
+        except Exception as e:
+            logger.warning(f"Could not script image transform, running it eagerly: {e}")
+            return pipeline
+    
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self._client.aclose()
     
     def is_loaded(self) -> bool:
-        """Check if model is loaded"""
-        return self.model is not None and ML_AVAILABLE
+        """
+        Check if model is loaded. Before the first image request the model
+        is not loaded yet but hasn't failed either, so this reports True
+        until a load attempt fails.
+        """
+        if not ML_AVAILABLE:
+            return False
+        return self.model is not None or not self._load_attempted
     
     async def analyze(self, image_url: str) -> Dict:
         """
@@ -72,92 +204,285 @@ class ImageDetector:
         Returns:
             Dictionary with score, label, confidence, and explanation
         """
+        key = hashlib.sha1(image_url.encode()).hexdigest()
+        return await self._inflight.do(key, lambda: self._analyze(image_url))
+    
+    async def _analyze(self, image_url: str) -> Dict:
+        """
+        Download and score an image (one run per in-flight URL). The payload
+        joins whatever other analyses arrive within the batching window, so
+        concurrent requests share one forward pass.
+        """
+        data = await self._download_image(image_url)
+        if data is None:
+            return self._fallback_analysis()
+        
+        await self._ensure_model()
+        if not self.is_loaded():
+            logger.warning("Model not loaded, using fallback analysis")
+            return self._fallback_analysis()
+        
         try:
-            # Download image
-            image = await self._download_image(image_url)
-            
-            if image is None:
-                return self._fallback_analysis()
-            
-            if not self.is_loaded():
-                logger.warning("Model not loaded, using fallback analysis")
-                return self._fallback_analysis()
-            
-            # Preprocess image
-            image_tensor = self.transform(image).unsqueeze(0)
-            
-            # Move to device
-            device = model_loader.get_device()
-            image_tensor = image_tensor.to(device)
-            
-            # Get predictions
-            with torch.no_grad():
-                outputs = self.model(image_tensor)
-                probabilities = torch.softmax(outputs, dim=-1)
-            
-            # Extract scores
-            probs = probabilities[0].cpu().numpy()
-            
-            # Calculate authenticity score
-            # For MVP, use simple heuristic based on model confidence
-            authenticity_score = self._calculate_authenticity_score(probs, image)
-            
-            # Determine label
-            if authenticity_score >= 0.7:
-                label = "trustworthy"
-            elif authenticity_score >= 0.4:
-                label = "suspicious"
-            else:
-                label = "misinformation"
-            
-            # Calculate confidence
-            confidence = float(max(probs))
+            score = await self._batcher.submit(data)
+        except Exception as e:
+            logger.error(f"Image analysis error: {e}")
+            return self._fallback_analysis()
+        
+        return self._build_result(*score) if score is not None else self._fallback_analysis()
+    
+    async def analyze_batch(self, image_urls: List[str]) -> List[Dict]:
+        """
+        Analyze several images with concurrent downloads and one forward pass
+        
+        Args:
+            image_urls: URLs of the images to analyze
             
-            # Generate explanation
-            explanation = self._generate_explanation(authenticity_score, label)
+        Returns:
+            One result dictionary per URL, in order
+        """
+        # Download images
+        payloads = await asyncio.gather(*[self._download_image(url) for url in image_urls])
+        
+        results = [self._fallback_analysis() for _ in image_urls]
+        valid = [i for i, data in enumerate(payloads) if data is not None]
+        
+        if not valid:
+            return results
+        
+        await self._ensure_model()
+        if not self.is_loaded():
+            logger.warning("Model not loaded, using fallback analysis")
+            return results
+        
+        if self._pending is None:
+            self._pending = asyncio.Semaphore(self.MAX_PENDING_BATCHES)
+        
+        try:
+            # Decoding, preprocessing and inference all block; keep them off the loop
+            loop = asyncio.get_running_loop()
+            async with self._pending:
+                scores = await loop.run_in_executor(
+                    INFER_POOL, self._score_batch, [payloads[i] for i in valid]
+                )
             
-            return {
-                'score': authenticity_score,
-                'label': label,
-                'confidence': confidence,
-                'explanation': explanation
-            }
+            for i, score in zip(valid, scores):
+                if score is not None:
+                    results[i] = self._build_result(*score)
             
         except Exception as e:
             logger.error(f"Image analysis error: {e}")
-            return self._fallback_analysis()
+        
+        return results
     
-    async def _download_image(self, image_url: str) -> Image.Image:
-        """Download image from URL"""
+    def _score_batch(self, payloads: List[bytes]) -> List[Optional[Tuple]]:
+        """
+        Decode, run the model and check artifacts for a batch of images
+        
+        Returns:
+            (max_prob, score, label) per payload, None where decoding failed
+        """
+        images = [self._decode_image(data) for data in payloads]
+        decoded = [image for image in images if image is not None]
+        
+        if not decoded:
+            return [None] * len(images)
+        
+        max_probs = self._predict_batch(decoded)
+        artifacts = [self._check_artifacts(image) for image in decoded]
+        scores = self._calculate_authenticity_scores(max_probs, artifacts)
+        
+        # Bucket the whole batch at once instead of branching per image;
+        # right=True keeps the ">= threshold" semantics
+        labels = torch.bucketize(scores, _LABEL_BOUNDARIES, right=True).tolist()
+        
+        scored = iter(zip(max_probs, scores.tolist(), labels))
+        return [
+            next(scored) if image is not None else None
+            for image in images
+        ]
+    
+    def _decode_image(self, data: bytes):
+        """
+        Decode image bytes to a uint8 RGB CHW tensor. JPEGs are decoded by
+        nvJPEG straight into device memory when running on CUDA.
+        """
+        if TORCHVISION_IO_AVAILABLE:
+            try:
+                encoded = torch.frombuffer(bytearray(data), dtype=torch.uint8)
+                if data[:3] == b'\xff\xd8\xff':
+                    return decode_jpeg(encoded, mode=ImageReadMode.RGB, device=model_loader.get_device())
+                return decode_image(encoded, mode=ImageReadMode.RGB)
+            except RuntimeError as e:
+                # Formats torchvision can't read (e.g. GIF, some WebP) go through PIL
+                logger.debug(f"torchvision decode failed, using PIL: {e}")
+        
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(image_url)
-                response.raise_for_status()
-                image = Image.open(BytesIO(response.content)).convert('RGB')
-                return image
+            image = Image.open(BytesIO(data)).convert('RGB')
+            return torch.from_numpy(np.array(image)).permute(2, 0, 1)
         except Exception as e:
-            logger.error(f"Failed to download image: {e}")
+            logger.error(f"Failed to decode image: {e}")
             return None
     
-    def _calculate_authenticity_score(self, probs, image: Image.Image) -> float:
+    def _predict_batch(self, images: List):
         """
-        Calculate authenticity score using multiple signals
+        Preprocess on the model device and run one forward pass
+        
+        Args:
+            images: uint8 CHW tensors, on the CPU or already on the device
+            
+        Returns:
+            Top class probability per image
         """
-        if not ML_AVAILABLE:
-            return 0.6
+        device = model_loader.get_device()
+        
+        tensors = []
+        for pixels in images:
+            # Only the compact uint8 pixels cross to the device
+            if pixels.device.type == "cpu" and device == "cuda":
+                pixels = self._stage(pixels)
+            tensors.append(self.transform(pixels))
+        
+        batch = torch.stack(tensors).to(self._dtype)
+        
+        if self._onnx:
+            return self._predict_onnx(batch)
+        
+        # Compiled and captured graphs are shape-specialized; pad to a power
+        # of two so only a handful of batch sizes are ever built
+        n = len(tensors)
+        size = (1 << (n - 1).bit_length()) if (self._compiled or self._graphs_enabled) else n
+        if size > n:
+            batch = torch.cat([batch, batch.new_zeros((size - n,) + tuple(batch.shape[1:]))])
+        
+        # Get predictions
+        with torch.inference_mode():
+            outputs = self._run_graph(batch) if self._graphs_enabled else self.model(batch)
+            # Softmax in float32 regardless of the inference dtype
+            probabilities = torch.softmax(outputs[:n].float(), dim=-1)
+            # Only the top probability is used; reduce on the device and copy
+            # N scalars back instead of N x 1000
+            max_probs = probabilities.max(dim=-1).values
+        
+        return max_probs.cpu().tolist()
+    
+    def _predict_onnx(self, batch) -> List[float]:
+        """Top class probability per image from the ONNX Runtime session"""
+        logits = self.model.run(None, {'input': batch.cpu().numpy()})[0]
+        # max softmax = 1 / sum(exp(logits - max))
+        shifted = logits - logits.max(axis=-1, keepdims=True)
+        return (1.0 / np.exp(shifted).sum(axis=-1)).tolist()
+    
+    def _run_graph(self, batch):
+        """Replay the CUDA graph captured for this batch size, capturing it on first use"""
+        size = batch.shape[0]
+        
+        # Static input/output buffers are shared, so replays are serialized
+        with self._graph_lock:
+            entry = self._graphs.get(size)
+            if entry is None:
+                try:
+                    entry = self._capture_graph(size)
+                except Exception as e:
+                    logger.warning(f"CUDA graph capture failed, using eager mode: {e}")
+                    self._graphs_enabled = False
+                    return self.model(batch)
+                self._graphs[size] = entry
             
-        # Base score from model confidence
-        base_score = float(max(probs))
+            graph, static_in, static_out = entry
+            static_in.copy_(batch)
+            graph.replay()
+            return static_out.clone()
+    
+    def _capture_graph(self, size: int):
+        """Capture one forward pass at a fixed batch size into a CUDA graph"""
+        static_in = torch.zeros((size, 3, 224, 224), dtype=self._dtype, device="cuda")
         
-        # Check for common AI generation artifacts
-        artifacts_score = self._check_artifacts(image)
+        # Warm up on a side stream so lazy initialization isn't captured
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                self.model(static_in)
+        torch.cuda.current_stream().wait_stream(stream)
         
-        # Combine scores
-        final_score = (base_score * 0.6) + (artifacts_score * 0.4)
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph):
+            static_out = self.model(static_in)
         
-        return min(1.0, max(0.0, final_score))
+        return graph, static_in, static_out
     
-    def _check_artifacts(self, image: Image.Image) -> float:
+    def _stage(self, pixels):
+        """
+        Copy CPU pixels to the GPU through pinned staging buffers that are
+        reused across calls. Two buffers per thread alternate, so filling one
+        overlaps with the asynchronous copy out of the other.
+        """
+        local = self._staging
+        if not hasattr(local, 'buffers'):
+            local.buffers = [None, None]
+            local.events = [None, None]
+            local.turn = 0
+        
+        i = local.turn
+        local.turn ^= 1
+        
+        # Don't overwrite a buffer whose previous copy is still in flight
+        if local.events[i] is not None:
+            local.events[i].synchronize()
+        
+        n = pixels.numel()
+        if local.buffers[i] is None or local.buffers[i].numel() < n:
+            local.buffers[i] = torch.empty(n, dtype=torch.uint8, pin_memory=True)
+        
+        host = local.buffers[i][:n].view(pixels.shape)
+        host.copy_(pixels)
+        out = host.to("cuda", non_blocking=True)
+        
+        event = torch.cuda.Event()
+        event.record()
+        local.events[i] = event
+        return out
+    
+    def _build_result(self, max_prob: float, authenticity_score: float, label_index: int) -> Dict:
+        """Turn the top class probability and scored bucket for one image into an analysis result"""
+        label = _LABELS[label_index]
+        
+        # Calculate confidence
+        confidence = max_prob
+        
+        # Generate explanation
+        explanation = self._generate_explanation(authenticity_score, label)
+        
+        return {
+            'score': authenticity_score,
+            'label': label,
+            'confidence': confidence,
+            'explanation': explanation
+        }
+    
+    async def _download_image(self, image_url: str) -> Optional[bytes]:
+        """Download encoded image bytes from URL"""
+        try:
+            response = await self._client.get(image_url)
+            response.raise_for_status()
+            return response.content
+        except Exception as e:
+            logger.error(f"Failed to download image: {e}")
+            return None
+    
+    def _calculate_authenticity_scores(self, max_probs: List[float], artifacts_scores: List[float]):
+        """
+        Calculate authenticity scores for a batch using multiple signals
+        """
+        # Base score from model confidence
+        base_scores = torch.tensor(max_probs, dtype=torch.float32)
+        
+        # Combine with the check for common AI generation artifacts
+        final_scores = (base_scores * 0.6) + (torch.tensor(artifacts_scores, dtype=torch.float32) * 0.4)
+        
+        return final_scores.clamp(0.0, 1.0)
+    
+    def _check_artifacts(self, pixels) -> float:
         """
         Check for common AI generation artifacts
         Simple heuristic-based approach for MVP
@@ -166,12 +491,13 @@ class ImageDetector:
             return 0.7
             
         try:
-            # Convert to numpy array
-            img_array = np.array(image)
-            
-            # Check image statistics
-            mean_val = np.mean(img_array)
-            std_val = np.std(img_array)
+            # Check image statistics from a single pass over the pixels:
+            # a 256-bin histogram gives both moments without float copies,
+            # and only the 256 counts leave the device
+            hist = torch.bincount(pixels.flatten(), minlength=256).cpu().numpy()
+            n = hist.sum()
+            mean_val = np.dot(hist, _LEVELS) / n
+            std_val = np.sqrt(max(np.dot(hist, _LEVELS_SQ) / n - mean_val * mean_val, 0.0))
             
             # Simple heuristic: unusual statistics might indicate manipulation
             if std_val < 20 or std_val > 100:
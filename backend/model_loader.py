@@ -5,6 +5,8 @@ Handles model initialization and caching
 
 import os
 import logging
+import threading
+from typing import Optional
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,77 +20,123 @@ except ImportError:
     ML_AVAILABLE = False
     torch = None
 
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
+# ONNX Runtime execution providers in order of preference
+ORT_PROVIDERS = [
+    'TensorrtExecutionProvider',
+    'OpenVINOExecutionProvider',
+    'CUDAExecutionProvider',
+    'CPUExecutionProvider'
+]
+
+DEFAULT_TEXT_MODEL = "mrm8488/bert-tiny-finetuned-fake-news-detection"
+DEFAULT_MULTILINGUAL_MODEL = "MoritzLaurer/mDeBERTa-v3-base-mnli-xnli"
+
 class ModelLoader:
     """Manages loading and caching of ML models"""
     
     def __init__(self):
         self.models = {}
         self.tokenizers = {}
+        # Serializes check-and-load, so detectors loading from different
+        # threads at startup share one copy of each model
+        self._lock = threading.RLock()
         if ML_AVAILABLE and torch:
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
         else:
             self.device = "cpu"
+        
+        if self.device == "cuda":
+            # Any float32 matmul/conv left (e.g. softmax inputs, layers kept
+            # in fp32) may use TF32 tensor cores; cuDNN benchmarks conv
+            # algorithms once per input shape, and shapes here are bucketed
+            torch.set_float32_matmul_precision('high')
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cudnn.benchmark = True
         logger.info(f"Using device: {self.device}")
     
-    def load_text_model(self, model_name: str = "mrm8488/bert-tiny-finetuned-fake-news-detection"):
+    def load_text_model(self, model_name: Optional[str] = None):
         """
         Load pretrained text classification model (English)
+        Defaults to $TEXT_MODEL_NAME, or DEFAULT_TEXT_MODEL when unset
         """
-        if not ML_AVAILABLE:
-            logger.warning("ML not available, skipping text model load")
-            return None, None
-            
-        try:
-            if model_name in self.models:
-                logger.info(f"Using cached model: {model_name}")
-                return self.models[model_name], self.tokenizers[model_name]
-            
-            logger.info(f"Loading text model: {model_name}")
-            
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForSequenceClassification.from_pretrained(model_name)
-            model.to(self.device)
-            model.eval()
-            
-            self.models[model_name] = model
-            self.tokenizers[model_name] = tokenizer
-            
-            logger.info(f"Successfully loaded: {model_name}")
-            return model, tokenizer
-            
-        except Exception as e:
-            logger.error(f"Failed to load text model: {e}")
-            raise
+        model_name = model_name or os.getenv('TEXT_MODEL_NAME', DEFAULT_TEXT_MODEL)
+        return self._load_sequence_classifier(model_name, "text")
 
-    def load_multilingual_model(self, model_name: str = "MoritzLaurer/mDeBERTa-v3-base-mnli-xnli"):
+    def load_multilingual_model(self, model_name: str = DEFAULT_MULTILINGUAL_MODEL):
         """
         Load multilingual zero-shot classification model
         """
+        return self._load_sequence_classifier(model_name, "multilingual")
+    
+    def _load_sequence_classifier(self, model_name: str, kind: str):
+        """Load a Hugging Face sequence classifier once per process"""
         if not ML_AVAILABLE:
-            logger.warning("ML not available, skipping multilingual model load")
+            logger.warning(f"ML not available, skipping {kind} model load")
             return None, None
             
-        try:
-            if model_name in self.models:
-                logger.info(f"Using cached model: {model_name}")
-                return self.models[model_name], self.tokenizers[model_name]
-            
-            logger.info(f"Loading multilingual model: {model_name}")
-            
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForSequenceClassification.from_pretrained(model_name)
-            model.to(self.device)
-            model.eval()
-            
-            self.models[model_name] = model
-            self.tokenizers[model_name] = tokenizer
-            
-            logger.info(f"Successfully loaded: {model_name}")
-            return model, tokenizer
-            
-        except Exception as e:
-            logger.error(f"Failed to load multilingual model: {e}")
-            raise
+        with self._lock:
+            try:
+                if model_name in self.models:
+                    logger.info(f"Using cached model: {model_name}")
+                    return self.models[model_name], self.tokenizers[model_name]
+                
+                logger.info(f"Loading {kind} model: {model_name}")
+                
+                try:
+                    tokenizer, model = self._from_pretrained(model_name, local_files_only=True)
+                except OSError:
+                    # Not in the shared cache yet; download once, later workers reuse it
+                    logger.info(f"{model_name} not cached locally, downloading")
+                    tokenizer, model = self._from_pretrained(model_name, local_files_only=False)
+                model.to(self.device)
+                model.eval()
+                model.requires_grad_(False)
+                
+                # INT8 Linear layers on CPU; with TEXT_CPU_BF16 the detector
+                # autocasts float weights to bfloat16 instead
+                if self.device == "cpu" and os.getenv('TEXT_CPU_BF16', 'false').lower() != 'true':
+                    model = self._quantize_dynamic(model)
+                
+                self.models[model_name] = model
+                self.tokenizers[model_name] = tokenizer
+                
+                logger.info(f"Successfully loaded: {model_name}")
+                return model, tokenizer
+                
+            except Exception as e:
+                logger.error(f"Failed to load {kind} model: {e}")
+                raise
+    
+    def _from_pretrained(self, model_name: str, local_files_only: bool):
+        """
+        Build tokenizer and model from the Hugging Face cache ($HF_HOME). With
+        local_files_only no update checks hit the network, so workers sharing
+        a pre-populated cache start without any downloads.
+        """
+        tokenizer = AutoTokenizer.from_pretrained(
+            model_name, use_fast=True, local_files_only=local_files_only
+        )
+        if not getattr(tokenizer, 'is_fast', False):
+            # use_fast silently falls back when the model ships no
+            # tokenizer.json and the tokenizers package can't convert it
+            logger.warning(f"No fast (Rust) tokenizer for {model_name}, tokenization will be slow")
+        # low_cpu_mem_usage loads weights straight into the model (safetensors
+        # checkpoints are memory-mapped, so the page cache is shared between
+        # worker processes) instead of building a random init first
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_name,
+            low_cpu_mem_usage=True,
+            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+            local_files_only=local_files_only
+        )
+        return tokenizer, model
     
     def load_image_model(self):
         """
@@ -98,28 +146,189 @@ class ModelLoader:
             logger.warning("ML not available, skipping image model load")
             return None
             
-        try:
-            model_name = "resnet18"
-            
-            if model_name in self.models:
-                logger.info(f"Using cached model: {model_name}")
-                return self.models[model_name]
-            
-            logger.info(f"Loading image model: {model_name}")
-            
-            from torchvision import models
-            model = models.resnet18(pretrained=True)
-            model.to(self.device)
-            model.eval()
-            
-            self.models[model_name] = model
-            
-            logger.info(f"Successfully loaded: {model_name}")
-            return model
+        with self._lock:
+            try:
+                model_name = "resnet18"
+                
+                if model_name in self.models:
+                    logger.info(f"Using cached model: {model_name}")
+                    return self.models[model_name]
+                
+                logger.info(f"Loading image model: {model_name}")
+                
+                from torchvision import models
+                model = models.resnet18(pretrained=True)
+                model.to(self.device)
+                model.eval()
+                model.requires_grad_(False)
+                
+                if self.device == "cuda":
+                    # Half precision runs on tensor cores at half the bandwidth
+                    model = model.half()
+                else:
+                    model = self._quantize_dynamic(model)
+                
+                self.models[model_name] = model
+                
+                logger.info(f"Successfully loaded: {model_name}")
+                return model
+                
+            except Exception as e:
+                logger.error(f"Failed to load image model: {e}")
+                raise
+    
+    def load_image_onnx_session(self, path: Optional[str] = None):
+        """
+        Export the image model to ONNX once and open it with the best
+        available ONNX Runtime execution provider
+        """
+        if not ML_AVAILABLE or not ORT_AVAILABLE:
+            logger.warning("onnxruntime not available, skipping ONNX image model")
+            return None
             
-        except Exception as e:
-            logger.error(f"Failed to load image model: {e}")
-            raise
+        model_name = "resnet18_onnx"
+        if model_name in self.models:
+            logger.info(f"Using cached model: {model_name}")
+            return self.models[model_name]
+        
+        path = path or os.path.join(os.getenv('MODEL_CACHE_DIR', './models'), 'resnet18.onnx')
+        
+        with self._lock:
+            try:
+                # Another thread may have finished loading while we waited
+                if model_name in self.models:
+                    return self.models[model_name]
+                
+                if not os.path.exists(path):
+                    logger.info(f"Exporting image model to {path}")
+                    from torchvision import models
+                    model = models.resnet18(pretrained=True).eval()
+                    self._export_onnx(
+                        model,
+                        (torch.zeros(1, 3, 224, 224),),
+                        path,
+                        input_names=['input'],
+                        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}}
+                    )
+                
+                session = self._open_onnx_session(path)
+                
+                self.models[model_name] = session
+                
+                logger.info(f"Successfully loaded: {model_name} ({session.get_providers()[0]})")
+                return session
+                
+            except Exception as e:
+                logger.error(f"Failed to load ONNX image model: {e}")
+                return None
+    
+    def load_text_onnx_session(self, model_name: Optional[str] = None):
+        """
+        Export the text classifier to ONNX once and open it with the best
+        available ONNX Runtime execution provider
+        
+        Returns:
+            (session, tokenizer), or (None, None) when unavailable
+        """
+        if not ML_AVAILABLE or not ORT_AVAILABLE:
+            logger.warning("onnxruntime not available, skipping ONNX text model")
+            return None, None
+        
+        model_name = model_name or os.getenv('TEXT_MODEL_NAME', DEFAULT_TEXT_MODEL)
+        key = f"{model_name}_onnx"
+        if key in self.models:
+            logger.info(f"Using cached model: {key}")
+            return self.models[key], self.tokenizers[key]
+        
+        path = os.path.join(
+            os.getenv('MODEL_CACHE_DIR', './models'), model_name.replace('/', '__') + '.onnx'
+        )
+        
+        with self._lock:
+            try:
+                # Another thread may have finished loading while we waited
+                if key in self.models:
+                    return self.models[key], self.tokenizers[key]
+                
+                if os.path.exists(path):
+                    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+                else:
+                    try:
+                        tokenizer, model = self._from_pretrained(model_name, local_files_only=True)
+                    except OSError:
+                        logger.info(f"{model_name} not cached locally, downloading")
+                        tokenizer, model = self._from_pretrained(model_name, local_files_only=False)
+                    
+                    logger.info(f"Exporting text model to {path}")
+                    # Export from float32 on the CPU; the provider picks its own precision
+                    model = model.float().cpu().eval()
+                    input_names = list(tokenizer.model_input_names)
+                    example = tokenizer("export", return_tensors="pt")
+                    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+                    dynamic_axes['logits'] = {0: 'batch'}
+                    self._export_onnx(
+                        model,
+                        ({name: example[name] for name in input_names},),
+                        path,
+                        input_names=input_names,
+                        dynamic_axes=dynamic_axes
+                    )
+                
+                session = self._open_onnx_session(path)
+                
+                self.models[key] = session
+                self.tokenizers[key] = tokenizer
+                
+                logger.info(f"Successfully loaded: {key} ({session.get_providers()[0]})")
+                return session, tokenizer
+                
+            except Exception as e:
+                logger.error(f"Failed to load ONNX text model: {e}")
+                return None, None
+    
+    def _export_onnx(self, model, args, path: str, input_names, dynamic_axes):
+        """Export a model to ONNX through a temp file, other workers may be loading"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.onnx.export(
+            model,
+            args,
+            tmp_path,
+            input_names=input_names,
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=17
+        )
+        os.replace(tmp_path, path)
+    
+    def _open_onnx_session(self, path: str):
+        """Open an ONNX model with every preferred execution provider that is installed"""
+        available = ort.get_available_providers()
+        providers = [p for p in ORT_PROVIDERS if p in available]
+        if 'TensorrtExecutionProvider' in providers:
+            providers[providers.index('TensorrtExecutionProvider')] = (
+                'TensorrtExecutionProvider', self._tensorrt_options()
+            )
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(path, sess_options=options, providers=providers)
+    
+    def _tensorrt_options(self) -> dict:
+        """
+        FP16 TensorRT engines, serialized next to the models so they are built
+        once per GPU model rather than on every start (engines are GPU-specific)
+        """
+        gpu = torch.cuda.get_device_name(0) if torch.cuda.is_available() else "unknown"
+        cache_path = os.path.join(
+            os.getenv('MODEL_CACHE_DIR', './models'), 'tensorrt',
+            "".join(c if c.isalnum() else "_" for c in gpu)
+        )
+        os.makedirs(cache_path, exist_ok=True)
+        return {
+            'trt_fp16_enable': True,
+            'trt_engine_cache_enable': True,
+            'trt_engine_cache_path': cache_path
+        }
     
     def load_audio_model(self):
         """
@@ -129,27 +338,47 @@ class ModelLoader:
             logger.warning("ML not available, skipping audio model load")
             return None
             
+        with self._lock:
+            try:
+                model_name = "audio_cnn"
+                
+                if model_name in self.models:
+                    logger.info(f"Using cached model: {model_name}")
+                    return self.models[model_name]
+                
+                logger.info(f"Loading audio model: {model_name}")
+                
+                model = self._create_simple_audio_model()
+                model.to(self.device)
+                model.eval()
+                model.requires_grad_(False)
+                
+                if self.device == "cpu":
+                    model = self._quantize_dynamic(model)
+                
+                self.models[model_name] = model
+                
+                logger.info(f"Successfully loaded: {model_name}")
+                return model
+                
+            except Exception as e:
+                logger.error(f"Failed to load audio model: {e}")
+                raise
+    
+    def _quantize_dynamic(self, model):
+        """
+        Post-training dynamic INT8 quantization of Linear layers for CPU
+        inference (weights stored as int8, activations quantized on the fly)
+        """
         try:
-            model_name = "audio_cnn"
-            
-            if model_name in self.models:
-                logger.info(f"Using cached model: {model_name}")
-                return self.models[model_name]
-            
-            logger.info(f"Loading audio model: {model_name}")
-            
-            model = self._create_simple_audio_model()
-            model.to(self.device)
-            model.eval()
-            
-            self.models[model_name] = model
-            
-            logger.info(f"Successfully loaded: {model_name}")
-            return model
-            
+            quantized = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            logger.info("Applied dynamic INT8 quantization")
+            return quantized
         except Exception as e:
-            logger.error(f"Failed to load audio model: {e}")
-            raise
+            logger.warning(f"Dynamic quantization failed, keeping FP32 model: {e}")
+            return model
     
     def _create_simple_audio_model(self):
         """Create a simple CNN for audio classification"""
@@ -161,7 +390,10 @@ class ModelLoader:
                 self.conv1 = nn.Conv2d(1, 32, kernel_size=3, padding=1)
                 self.conv2 = nn.Conv2d(32, 64, kernel_size=3, padding=1)
                 self.pool = nn.MaxPool2d(2, 2)
-                self.fc1 = nn.Linear(64 * 32 * 32, 128)
+                # Global average pooling keeps the head at 64 -> 128 instead of
+                # a 65536 -> 128 (32MB) fully connected layer
+                self.gap = nn.AdaptiveAvgPool2d(1)
+                self.fc1 = nn.Linear(64, 128)
                 self.fc2 = nn.Linear(128, 2)
                 self.relu = nn.ReLU()
                 self.dropout = nn.Dropout(0.5)
@@ -169,13 +401,18 @@ class ModelLoader:
             def forward(self, x):
                 x = self.pool(self.relu(self.conv1(x)))
                 x = self.pool(self.relu(self.conv2(x)))
-                x = x.view(-1, 64 * 32 * 32)
+                x = self.gap(x).flatten(1)
                 x = self.dropout(self.relu(self.fc1(x)))
                 x = self.fc2(x)
                 return x
         
         return SimpleCNN()
     
+    def release_cached_memory(self):
+        """Return the CUDA caching allocator's unused blocks to the driver (shutdown only)"""
+        if ML_AVAILABLE and self.device == "cuda":
+            torch.cuda.empty_cache()
+    
     def get_device(self):
         """Get current device (CPU or CUDA)"""
         return self.device
@@ -1,4 +1,5 @@
-import requests
+import asyncio
+import httpx
 import json
 import time
 
@@ -31,43 +32,52 @@ SCENARIOS = [
     }
 ]
 
-def run_tests():
+async def run_one(client, scenario):
+    """Send one scenario; returns (response or exception, duration)"""
+    payload = {
+        "text": scenario['text'],
+        "url": scenario['url']
+    }
+    
+    start_time = time.time()
+    try:
+        resp = await client.post(f"{BASE_URL}/analyze/text", json=payload)
+    except Exception as e:
+        resp = e
+    return resp, time.time() - start_time
+
+async def run_tests():
     print(f"Testing Multilingual API at {BASE_URL}...\n")
     
-    for scenario in SCENARIOS:
+    # Scenarios are independent, send them all at once
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        outcomes = await asyncio.gather(*[run_one(client, scenario) for scenario in SCENARIOS])
+    
+    # Report in scenario order
+    for scenario, (resp, duration) in zip(SCENARIOS, outcomes):
         print(f"--- Testing Scenario: {scenario['name']} ---")
-        payload = {
-            "text": scenario['text'],
-            "url": scenario['url']
-        }
         
-        try:
-            start_time = time.time()
-            resp = requests.post(f"{BASE_URL}/analyze/text", json=payload)
-            duration = time.time() - start_time
+        if isinstance(resp, Exception):
+            print(f"Request Failed: {resp}")
+        elif resp.status_code == 200:
+            result = resp.json()
+            breakdown = result.get('breakdown', {})
+            detected_lang = breakdown.get('language', 'unknown')
             
-            if resp.status_code == 200:
-                result = resp.json()
-                breakdown = result.get('breakdown', {})
-                detected_lang = breakdown.get('language', 'unknown')
-                
-                print(f"Status: {resp.status_code} (took {duration:.2f}s)")
-                print(f"Detected Language: {detected_lang.upper()}")
-                print(f"Label: {result.get('label', 'N/A').upper()}")
-                print(f"Score: {result.get('score', 0):.2f}")
-                
-                if detected_lang == scenario['expected_lang']:
-                    print("✅ Language Detection: PASS")
-                else:
-                    print(f"❌ Language Detection: FAIL (Expected {scenario['expected_lang']})")
-                    
+            print(f"Status: {resp.status_code} (took {duration:.2f}s)")
+            print(f"Detected Language: {detected_lang.upper()}")
+            print(f"Label: {result.get('label', 'N/A').upper()}")
+            print(f"Score: {result.get('score', 0):.2f}")
+            
+            if detected_lang == scenario['expected_lang']:
+                print("✅ Language Detection: PASS")
             else:
-                print(f"Error: {resp.status_code} - {resp.text}")
+                print(f"❌ Language Detection: FAIL (Expected {scenario['expected_lang']})")
                 
-        except Exception as e:
-            print(f"Request Failed: {e}")
+        else:
+            print(f"Error: {resp.status_code} - {resp.text}")
         
         print("\n")
 
 if __name__ == "__main__":
-    run_tests()
+    asyncio.run(run_tests())
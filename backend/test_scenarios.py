@@ -1,4 +1,5 @@
-import requests
+import asyncio
+import httpx
 import json
 import time
 
@@ -38,45 +39,53 @@ SCENARIOS = [
     }
 ]
 
-def run_tests():
-    print(f"Testing API at {BASE_URL}...\n")
+async def run_one(client, scenario):
+    """Send one scenario; returns (response or exception, duration)"""
+    payload = {
+        "text": scenario['text'],
+        "url": scenario['url']
+    }
     
-    # Check Health
+    start_time = time.time()
     try:
-        resp = requests.get(f"{BASE_URL}/health")
-        print(f"Health Check: {resp.status_code} - {resp.json()}\n")
+        resp = await client.post(f"{BASE_URL}/analyze/text", json=payload)
     except Exception as e:
-        print(f"Health Check Failed: {e}")
-        return
+        resp = e
+    return resp, time.time() - start_time
 
-    # Run Scenarios
-    for scenario in SCENARIOS:
-        print(f"--- Testing Scenario: {scenario['name']} ---")
-        payload = {
-            "text": scenario['text'],
-            "url": scenario['url']
-        }
-        
+async def run_tests():
+    print(f"Testing API at {BASE_URL}...\n")
+    
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        # Check Health
         try:
-            start_time = time.time()
-            resp = requests.post(f"{BASE_URL}/analyze/text", json=payload)
-            duration = time.time() - start_time
-            
-            if resp.status_code == 200:
-                result = resp.json()
-                print(f"Status: {resp.status_code} (took {duration:.2f}s)")
-                print(f"Label: {result.get('label', 'N/A').upper()}")
-                print(f"Score: {result.get('score', 0):.2f}")
-                print(f"Confidence: {result.get('confidence', 0):.2f}")
-                print(f"Explanation: {result.get('explanation', 'N/A')}")
-                print(f"Breakdown: {json.dumps(result.get('breakdown', {}), indent=2)}")
-            else:
-                print(f"Error: {resp.status_code} - {resp.text}")
-                
+            resp = await client.get(f"{BASE_URL}/health")
+            print(f"Health Check: {resp.status_code} - {resp.json()}\n")
         except Exception as e:
-            print(f"Request Failed: {e}")
+            print(f"Health Check Failed: {e}")
+            return
+
+        # Run Scenarios concurrently
+        outcomes = await asyncio.gather(*[run_one(client, scenario) for scenario in SCENARIOS])
+    
+    # Report in scenario order
+    for scenario, (resp, duration) in zip(SCENARIOS, outcomes):
+        print(f"--- Testing Scenario: {scenario['name']} ---")
+        
+        if isinstance(resp, Exception):
+            print(f"Request Failed: {resp}")
+        elif resp.status_code == 200:
+            result = resp.json()
+            print(f"Status: {resp.status_code} (took {duration:.2f}s)")
+            print(f"Label: {result.get('label', 'N/A').upper()}")
+            print(f"Score: {result.get('score', 0):.2f}")
+            print(f"Confidence: {result.get('confidence', 0):.2f}")
+            print(f"Explanation: {result.get('explanation', 'N/A')}")
+            print(f"Breakdown: {json.dumps(result.get('breakdown', {}), indent=2)}")
+        else:
+            print(f"Error: {resp.status_code} - {resp.text}")
         
         print("\n")
 
 if __name__ == "__main__":
-    run_tests()
+    asyncio.run(run_tests())
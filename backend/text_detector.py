@@ -3,10 +3,17 @@ IMPROVED Text Detector - Significantly Better Accuracy
 Combines multiple signals: domain trust, linguistic analysis, source verification, and ML models
 """
 
+import asyncio
+import collections
+import functools
+import hashlib
 import logging
-from typing import Dict, List, Optional
+import os
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 import re
+import threading
+from cachetools import LRUCache, TTLCache
 
 # Configure logging first
 logging.basicConfig(level=logging.INFO)
@@ -25,8 +32,98 @@ except ImportError:
     model_loader = None
     logger.warning("ML dependencies (torch, transformers) not found. Running in lightweight mode.")
 
+# Optional Aho-Corasick matcher (pyahocorasick) for the phrase scan
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 # Import Groq Analyzer
 from groq_analyzer import groq_analyzer
+from concurrency import INFER_POOL, MicroBatcher, SingleFlight
+
+# Sentence boundaries for the structure check
+_SENTENCE_SPLIT = re.compile(r'[.!?]+')
+
+# Free/abused TLDs that lower the metadata score
+_SUSPICIOUS_TLDS = ('.tk', '.ml', '.ga', '.cf', '.gq', '.xyz', '.info')
+
+# Phrase buckets in the linguistic scan
+_RED_FLAG, _CREDIBILITY, _EMOTIONAL = range(3)
+
+def _build_phrase_automaton(buckets: Tuple[Dict[str, float], ...]):
+    """Compile every phrase list into one automaton, matched in a single pass over the text"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for bucket, phrases in enumerate(buckets):
+        for phrase, weight in phrases.items():
+            automaton.add_word(phrase, (bucket, phrase, weight))
+    automaton.make_automaton()
+    return automaton
+
+def _build_phrase_pattern(buckets: Tuple[Dict[str, float], ...]):
+    """
+    Fallback for when pyahocorasick is missing: one regex alternation over
+    every phrase. The lookahead makes finditer report overlapping matches
+    (e.g. both "some experts" and "experts say"), like substring checks do.
+    
+    Returns:
+        (pattern, {phrase: (bucket, phrase, weight)})
+    """
+    index = {}
+    for bucket, phrases in enumerate(buckets):
+        for phrase, weight in phrases.items():
+            index[phrase] = (bucket, phrase, weight)
+    
+    alternation = '|'.join(re.escape(p) for p in sorted(index, key=len, reverse=True))
+    return re.compile(f'(?=({alternation}))'), index
+
+@functools.lru_cache(maxsize=4096)
+def _parsed_url(url: str) -> Tuple[str, int]:
+    """(netloc, dot count) for a URL, parsed once per distinct URL"""
+    netloc = _netloc(url)
+    return netloc, netloc.count('.')
+
+def _netloc(url: str) -> str:
+    """
+    Network location of a URL. Plain http(s) URLs are sliced directly
+    instead of fully parsed; anything unusual (IPv6 literals, embedded
+    whitespace, other schemes) goes through urlparse for its exact rules.
+    """
+    if url[:8].lower().startswith(('http://', 'https://')) and not any(c in url for c in '[ \t\r\n'):
+        start = url.index('://') + 3
+        end = len(url)
+        for delimiter in '/?#':
+            i = url.find(delimiter, start)
+            if 0 <= i < end:
+                end = i
+        return url[start:end]
+    return urlparse(url).netloc
+
+def _build_domain_trie(domains: Dict[str, float]) -> Dict:
+    """Nest domains by reversed labels (com -> reuters); a node's None key holds its score"""
+    trie = {}
+    for domain, score in domains.items():
+        node = trie
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        node[None] = score
+    return trie
+
+def _walk_domain_trie(trie: Dict, labels: List[str]) -> List[Tuple[int, float]]:
+    """(depth, score) for every listed domain the reversed labels pass through"""
+    hits = []
+    node = trie
+    for depth, label in enumerate(labels, 1):
+        node = node.get(label)
+        if node is None:
+            break
+        if None in node:
+            hits.append((depth, node[None]))
+    return hits
 
 class ImprovedTextDetector:
     """Advanced misinformation detector with multi-signal analysis"""
@@ -75,6 +172,11 @@ class ImprovedTextDetector:
         'realfarmacy.com': 0.22, 'collective-evolution.com': 0.25,
     }
     
+    # Both lists keyed by reversed labels, so a lookup costs one step per
+    # label of the URL's host instead of a scan over every listed domain
+    _TRUSTED_TRIE = _build_domain_trie(TRUSTED_DOMAINS)
+    _UNRELIABLE_TRIE = _build_domain_trie(UNRELIABLE_DOMAINS)
+    
     # Misinformation indicators with weights
     STRONG_RED_FLAGS = {
         # Clickbait patterns (-0.20 each)
@@ -133,9 +235,62 @@ class ImprovedTextDetector:
         'breakthrough': -0.05, 'revolutionary': -0.05,
     }
     
+    # Indexed by the _RED_FLAG/_CREDIBILITY/_EMOTIONAL bucket ids
+    _PHRASE_AUTOMATON = _build_phrase_automaton(
+        (STRONG_RED_FLAGS, CREDIBILITY_SIGNALS, EMOTIONAL_TRIGGERS)
+    )
+    _PHRASE_PATTERN, _PHRASE_INDEX = _build_phrase_pattern(
+        (STRONG_RED_FLAGS, CREDIBILITY_SIGNALS, EMOTIONAL_TRIGGERS)
+    )
+    
+    # A domain score at or beyond these bounds, backed by a linguistic score
+    # on the same side, fixes the label whatever ML score in [0, 1] comes
+    # back, so the (expensive) ML stage is skipped. On an unreliable domain
+    # only fully red-flagged text (linguistic score 0) is that clear-cut.
+    DECISIVE_TRUST = 0.95
+    DECISIVE_DISTRUST = 0.20
+    DECISIVE_LINGUISTIC_HIGH = 0.65
+    DECISIVE_LINGUISTIC_LOW = 0.0
+    # Shorter texts (stripped) are not worth an ML pass, the classifier can't score them
+    MIN_ML_CHARS = 20
+    
+    RESULT_CACHE_SIZE = 10000
+    # Seconds a cached result is served before the text is analyzed again
+    RESULT_CACHE_TTL = int(os.getenv('CACHE_TTL', '3600'))
+    # Linguistic scores keyed by text alone, shared across URLs
+    LINGUISTIC_CACHE_SIZE = 2048
+    
+    # Concurrent local-model predictions are coalesced into one forward pass
+    MAX_BATCH = int(os.getenv('TEXT_MAX_BATCH', '16'))
+    BATCH_WINDOW = float(os.getenv('TEXT_BATCH_WAIT_MS', '5')) / 1000.0  # seconds
+    # Token-length buckets; a batch is split so short texts aren't padded to long ones
+    LENGTH_BUCKETS = (64, 128, 256, 512)
+    
+    # bfloat16 autocast for CPU inference; only worth it on CPUs with native
+    # bf16 support (AVX512-BF16 / AMX), so it is opt-in
+    CPU_BF16 = os.getenv('TEXT_CPU_BF16', 'false').lower() == 'true'
+    
+    # "torch" (default) or "onnx" to run the classifier through ONNX Runtime
+    BACKEND = os.getenv('TEXT_BACKEND', 'torch').lower()
+    
     def __init__(self):
         self.model = None
         self.tokenizer = None
+        self._onnx = False
+        self._compiled = False
+        # Per-thread CUDA streams for host to device input copies
+        self._copy_streams = threading.local()
+        # Identical concurrent requests (same text and URL) share one analysis
+        self._inflight = SingleFlight()
+        # Completed analyses keyed by the same text/URL digest
+        self._result_cache = TTLCache(maxsize=self.RESULT_CACHE_SIZE, ttl=self.RESULT_CACHE_TTL)
+        self._linguistic_cache = LRUCache(maxsize=self.LINGUISTIC_CACHE_SIZE)
+        self._batcher = MicroBatcher(
+            self._predict_local_batch,
+            max_batch=self.MAX_BATCH,
+            max_wait=self.BATCH_WINDOW,
+            executor=INFER_POOL
+        )
         self._load_model()
     
     def _load_model(self):
@@ -144,136 +299,297 @@ class ImprovedTextDetector:
             return
 
         try:
+            if self.BACKEND == "onnx":
+                self.model, self.tokenizer = model_loader.load_text_onnx_session()
+                if self.model:
+                    self._onnx = True
+                    logger.info("Text detector initialized with ONNX Runtime")
+                    return
+                logger.warning("ONNX text backend unavailable, using PyTorch")
+            
             # Try to load a better fact-checking model if available
             # For now, fallback to sentiment but we'll use it more carefully
             self.model, self.tokenizer = model_loader.load_text_model()
+            if model_loader.get_device() == "cuda":
+                self.model = self._compile_model(self.model)
             logger.info("Text detector initialized")
         except Exception as e:
             logger.error(f"Model loading failed: {e}")
             self.model = None
             self.tokenizer = None
     
+    def _compile_model(self, model):
+        """
+        Compile the forward pass with TorchDynamo and warm it up at every
+        length bucket so compilation happens at load. reduce-overhead replays
+        each (batch, length) shape as a captured CUDA graph, so small batches
+        aren't dominated by kernel launch overhead.
+        """
+        if not hasattr(torch, 'compile'):
+            return model
+        
+        try:
+            compiled = torch.compile(model, mode="reduce-overhead", dynamic=True)
+            with torch.inference_mode():
+                for length in self.LENGTH_BUCKETS:
+                    # Same inputs the tokenizer produces, so guards match real calls
+                    example = torch.ones((1, length), dtype=torch.long, device="cuda")
+                    compiled(**{name: example for name in self.tokenizer.model_input_names})
+            self._compiled = True
+            return compiled
+        except Exception as e:
+            logger.warning(f"torch.compile failed for text model, using eager mode: {e}")
+            return model
+    
     def is_loaded(self) -> bool:
         return self.model is not None and self.tokenizer is not None
     
+    def clear_cache(self) -> int:
+        """Drop cached analyses and linguistic scores; returns the number of results dropped"""
+        dropped = len(self._result_cache)
+        self._result_cache.clear()
+        self._linguistic_cache.clear()
+        return dropped
+    
     def _get_domain_trust_score(self, url: Optional[str]) -> Optional[float]:
         """Get trust score for domain"""
         if not url:
             return None
         
         try:
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower()
-            
-            # Remove www prefix
-            if domain.startswith('www.'):
-                domain = domain[4:]
-            
-            # Check unreliable domains first
-            for unreliable_domain, score in self.UNRELIABLE_DOMAINS.items():
-                if domain == unreliable_domain or domain.endswith('.' + unreliable_domain):
-                    return score
-            
-            # Check trusted domains
-            if domain in self.TRUSTED_DOMAINS:
-                return self.TRUSTED_DOMAINS[domain]
-            
-            # Check for .edu or .gov
-            if domain.endswith('.edu'):
-                return self.TRUSTED_DOMAINS['edu']
-            if domain.endswith('.gov'):
-                return self.TRUSTED_DOMAINS['gov']
-            
-            # Check if subdomain of trusted domain
-            for trusted_domain, score in self.TRUSTED_DOMAINS.items():
-                if '.' in trusted_domain and domain.endswith('.' + trusted_domain):
-                    return score * 0.95  # Slight reduction for subdomains
-            
-            return None
+            return self._domain_trust_cached(url)
             
         except Exception as e:
             logger.error(f"Error parsing domain: {e}")
             return None
     
-    async def analyze(self, text: str, url: Optional[str] = None) -> Dict:
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _domain_trust_cached(url: str) -> Optional[float]:
+        """Trust score lookup, memoized per URL since articles repeat sources"""
+        cls = ImprovedTextDetector
+        domain = _parsed_url(url)[0].lower()
+        
+        # Remove www prefix
+        if domain.startswith('www.'):
+            domain = domain[4:]
+        
+        labels = domain.split('.')[::-1]
+        
+        # Check unreliable domains first (the domain itself or any parent)
+        unreliable = _walk_domain_trie(cls._UNRELIABLE_TRIE, labels)
+        if unreliable:
+            return unreliable[0][1]
+        
+        trusted = _walk_domain_trie(cls._TRUSTED_TRIE, labels)
+        if not trusted:
+            return None
+        
+        # Check trusted domains
+        depth, score = trusted[-1]
+        if depth == len(labels):
+            return score
+        
+        # Check for .edu or .gov (single-label roots)
+        if trusted[0][0] == 1 and labels[0] in ('edu', 'gov'):
+            return trusted[0][1]
+        
+        # Check if subdomain of trusted domain
+        return score * 0.95  # Slight reduction for subdomains
+    
+    def _is_decisive(self, domain_trust: Optional[float], linguistic_score: float) -> bool:
+        """Whether the domain and linguistic scores settle the label without the model"""
+        if domain_trust is None:
+            return False
+        if domain_trust >= self.DECISIVE_TRUST:
+            return linguistic_score >= self.DECISIVE_LINGUISTIC_HIGH
+        if domain_trust <= self.DECISIVE_DISTRUST:
+            return linguistic_score <= self.DECISIVE_LINGUISTIC_LOW
+        return False
+    
+    def _needs_ml(self, text: str, domain_trust: Optional[float], linguistic_score: float,
+                  force_ml: bool = False) -> bool:
+        """Whether the ML stage should run for a text"""
+        if force_ml:
+            return True
+        if len(text.strip()) < self.MIN_ML_CHARS:
+            return False
+        return not self._is_decisive(domain_trust, linguistic_score)
+    
+    async def analyze(self, text: str, url: Optional[str] = None, force_ml: bool = False) -> Dict:
         """
         Comprehensive text analysis with multiple signals
+        
+        Args:
+            force_ml: Run the ML stage even when the other signals decide the label
         """
+        key = self._cache_key(text, url, force_ml)
+        
+        cached = self._result_cache.get(key)
+        if cached is not None:
+            return self._copy_result(cached)
+        
+        result = await self._inflight.do(key, lambda: self._analyze(text, url, key, force_ml))
+        return self._copy_result(result)
+    
+    async def analyze_batch(self, items: List[Tuple[str, Optional[str]]], force_ml: bool = False) -> List[Dict]:
+        """
+        Analyze several texts, scoring all that need the local model in one forward pass
+        
+        Args:
+            items: (text, url) pairs
+            force_ml: Run the ML stage even when the other signals decide the label
+            
+        Returns:
+            One result dictionary per item, in order
+        """
+        keys = [self._cache_key(text, url, force_ml) for text, url in items]
+        results = {key: self._result_cache.get(key) for key in keys}
+        
+        # Duplicates within the batch are analyzed once
+        pending = {}
+        for key, (text, url) in zip(keys, items):
+            if results[key] is None and key not in pending:
+                pending[key] = (text, url)
+        
+        if pending:
+            try:
+                signals = {
+                    key: (self._get_domain_trust_score(url), self._analyze_linguistic_patterns(text),
+                          self._analyze_metadata(text, url))
+                    for key, (text, url) in pending.items()
+                }
+                
+                needs_ml = [
+                    key for key in pending
+                    if self._needs_ml(pending[key][0], signals[key][0], signals[key][1], force_ml)
+                ]
+                ml_scores = dict(zip(
+                    needs_ml, await self._analyze_batch_with_ml([pending[key][0] for key in needs_ml])
+                ))
+                
+                for key, (text, url) in pending.items():
+                    domain_trust, linguistic_score, metadata_score = signals[key]
+                    ml_score = ml_scores.get(key)
+                    results[key] = self._build_result(
+                        key, url, domain_trust, linguistic_score, ml_score, metadata_score,
+                        cache=not (key in ml_scores and ml_score is None)
+                    )
+                    
+            except Exception as e:
+                logger.error(f"Batch analysis error: {e}")
+                for key in pending:
+                    if results[key] is None:
+                        results[key] = self._fallback_analysis()
+        
+        return [self._copy_result(results[key]) for key in keys]
+    
+    @staticmethod
+    def _copy_result(result: Dict) -> Dict:
+        """Copy handed to callers, so mutating it can't corrupt the cached entry"""
+        copy = dict(result)
+        if copy.get('breakdown') is not None:
+            copy['breakdown'] = dict(copy['breakdown'])
+        return copy
+    
+    def _cache_key(self, text: str, url: Optional[str], force_ml: bool = False) -> str:
+        """Digest identifying a text/URL pair (and whether the ML stage was forced)"""
+        prefix = "ml\0" if force_ml else ""
+        return hashlib.sha1(f"{prefix}{url or ''}\0{text}".encode()).hexdigest()
+    
+    async def _analyze(self, text: str, url: Optional[str], key: str, force_ml: bool = False) -> Dict:
+        """Run all analysis components (one run per in-flight text/URL pair)"""
         try:
             # Get all analysis components
             domain_trust = self._get_domain_trust_score(url)
             linguistic_score = self._analyze_linguistic_patterns(text)
-            ml_score = await self._analyze_with_ml(text)
+            needs_ml = self._needs_ml(text, domain_trust, linguistic_score, force_ml)
+            ml_score = await self._analyze_with_ml(text) if needs_ml else None
             metadata_score = self._analyze_metadata(text, url)
             
-            # Combine scores with intelligent weighting
-            final_score = self._combine_scores(
-                domain_trust, linguistic_score, ml_score, metadata_score, url
-            )
-            
-            # Determine label
-            if final_score >= 0.70:
-                label = 'trustworthy'
-            elif final_score >= 0.40:
-                label = 'suspicious'
-            else:
-                label = 'misinformation'
-            
-            # Calculate confidence based on available signals
-            confidence = self._calculate_confidence(
-                domain_trust, linguistic_score, ml_score, metadata_score
-            )
-            
-            # Generate detailed explanation
-            explanation = self._generate_detailed_explanation(
-                final_score, label, domain_trust, linguistic_score, 
-                ml_score, metadata_score, url
+            return self._build_result(
+                key, url, domain_trust, linguistic_score, ml_score, metadata_score,
+                cache=not (needs_ml and ml_score is None)
             )
             
-            return {
-                'score': final_score,
-                'label': label,
-                'confidence': confidence,
-                'explanation': explanation,
-                'breakdown': {
-                    'domain_trust': domain_trust,
-                    'linguistic_score': linguistic_score,
-                    'ml_score': ml_score,
-                    'metadata_score': metadata_score
-                }
-            }
-            
         except Exception as e:
             logger.error(f"Analysis error: {e}")
             return self._fallback_analysis()
     
+    def _build_result(
+        self,
+        key: str,
+        url: Optional[str],
+        domain_trust: Optional[float],
+        linguistic_score: float,
+        ml_score: Optional[float],
+        metadata_score: float,
+        cache: bool = True
+    ) -> Dict:
+        """
+        Combine the component scores into a result and cache it. Pass
+        cache=False when the ML stage was needed but failed, so a transient
+        error doesn't pin a heuristics-only verdict.
+        """
+        # Combine scores with intelligent weighting
+        final_score = self._combine_scores(
+            domain_trust, linguistic_score, ml_score, metadata_score, url
+        )
+        
+        # Determine label
+        if final_score >= 0.70:
+            label = 'trustworthy'
+        elif final_score >= 0.40:
+            label = 'suspicious'
+        else:
+            label = 'misinformation'
+        
+        # Calculate confidence based on available signals
+        confidence = self._calculate_confidence(
+            domain_trust, linguistic_score, ml_score, metadata_score
+        )
+        
+        # Generate detailed explanation
+        explanation = self._generate_detailed_explanation(
+            final_score, label, domain_trust, linguistic_score, 
+            ml_score, metadata_score, url
+        )
+        
+        result = {
+            'score': final_score,
+            'label': label,
+            'confidence': confidence,
+            'explanation': explanation,
+            'breakdown': {
+                'domain_trust': domain_trust,
+                'linguistic_score': linguistic_score,
+                'ml_score': ml_score,
+                'metadata_score': metadata_score
+            }
+        }
+        if cache:
+            self._result_cache[key] = result
+        
+        return result
+    
     def _analyze_linguistic_patterns(self, text: str) -> float:
         """
         Advanced linguistic analysis for misinformation patterns
         """
+        # The same article is often submitted again from another URL
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        score = self._linguistic_cache.get(key)
+        if score is None:
+            score = self._linguistic_cache[key] = self._score_linguistic_patterns(text)
+        return score
+    
+    def _score_linguistic_patterns(self, text: str) -> float:
+        """Phrase scan plus structure analysis, uncached"""
         text_lower = text.lower()
         score = 0.60  # Start neutral
         
-        # Check red flags
-        red_flag_penalty = 0
-        for phrase, weight in self.STRONG_RED_FLAGS.items():
-            if phrase in text_lower:
-                red_flag_penalty += weight
-                logger.debug(f"Red flag detected: {phrase}")
-        
-        # Check credibility signals
-        credibility_boost = 0
-        for phrase, weight in self.CREDIBILITY_SIGNALS.items():
-            if phrase in text_lower:
-                credibility_boost += weight
-                logger.debug(f"Credibility signal: {phrase}")
-        
-        # Check emotional manipulation
-        emotional_penalty = 0
-        for word, weight in self.EMOTIONAL_TRIGGERS.items():
-            count = text_lower.count(word)
-            if count > 0:
-                emotional_penalty += weight * min(count, 3)  # Cap at 3 occurrences
+        # Check red flags, credibility signals and emotional manipulation
+        red_flag_penalty, credibility_boost, emotional_penalty = self._scan_phrases(text_lower)
         
         # Analyze structure
         structure_score = self._analyze_text_structure(text)
@@ -284,6 +600,34 @@ class ImprovedTextDetector:
         # Clamp to [0, 1]
         return max(0.0, min(1.0, score))
     
+    def _scan_phrases(self, text_lower: str) -> Tuple[float, float, float]:
+        """
+        Single pass over the text with the Aho-Corasick automaton, or the
+        compiled regex without pyahocorasick. Red flags and credibility
+        signals count once each, emotional triggers up to 3 occurrences.
+        """
+        if self._PHRASE_AUTOMATON is not None:
+            matches = (value for _, value in self._PHRASE_AUTOMATON.iter(text_lower))
+        else:
+            matches = (self._PHRASE_INDEX[m.group(1)] for m in self._PHRASE_PATTERN.finditer(text_lower))
+        
+        sums = [0.0, 0.0, 0.0]
+        seen = set()
+        emotional_counts = {}
+        
+        for bucket, phrase, weight in matches:
+            if bucket == _EMOTIONAL:
+                count = emotional_counts.get(phrase, 0)
+                if count < 3:  # Cap at 3 occurrences
+                    emotional_counts[phrase] = count + 1
+                    sums[bucket] += weight
+            elif phrase not in seen:
+                seen.add(phrase)
+                sums[bucket] += weight
+                logger.debug(f"{'Red flag detected' if bucket == _RED_FLAG else 'Credibility signal'}: {phrase}")
+        
+        return sums[_RED_FLAG], sums[_CREDIBILITY], sums[_EMOTIONAL]
+    
     def _analyze_text_structure(self, text: str) -> float:
         """
         Analyze text structure quality
@@ -291,22 +635,27 @@ class ImprovedTextDetector:
         score = 0.0
         
         # Check for proper sentences
-        sentences = re.split(r'[.!?]+', text)
+        sentences = _SENTENCE_SPLIT.split(text)
         valid_sentences = [s for s in sentences if len(s.strip()) > 10]
         
         if len(valid_sentences) >= 3:
             score += 0.05
         
+        # One C-level pass counts every character; the per-character checks
+        # below then run over the distinct characters only
+        char_counts = collections.Counter(text)
+        
         # Check for ALL CAPS (shouting)
-        caps_ratio = sum(1 for c in text if c.isupper()) / max(len(text), 1)
+        caps_count = sum(n for c, n in char_counts.items() if c.isupper())
+        caps_ratio = caps_count / max(len(text), 1)
         if caps_ratio > 0.3:
             score -= 0.10  # Heavy ALL CAPS penalty
         elif caps_ratio > 0.15:
             score -= 0.05
         
         # Check for excessive punctuation
-        exclamation_count = text.count('!')
-        question_count = text.count('?')
+        exclamation_count = char_counts['!']
+        question_count = char_counts['?']
         if exclamation_count > 5:
             score -= 0.08
         if question_count > 8:
@@ -328,18 +677,17 @@ class ImprovedTextDetector:
         # URL quality checks
         if url:
             # Check for suspicious TLDs
-            suspicious_tlds = ['.tk', '.ml', '.ga', '.cf', '.gq', '.xyz', '.info']
-            if any(url.endswith(tld) for tld in suspicious_tlds):
+            if url.endswith(_SUSPICIOUS_TLDS):
                 score -= 0.15
             
             # Check for excessive subdomains
-            parsed = urlparse(url)
-            subdomain_count = parsed.netloc.count('.')
+            subdomain_count = _parsed_url(url)[1]
             if subdomain_count > 3:
                 score -= 0.08
         
-        # Text length analysis
-        word_count = len(text.split())
+        # Text length analysis. Only "under 50" / "over 300" matter, so stop
+        # splitting after 300 words instead of building a list of every word
+        word_count = len(text.split(None, 300))
         if word_count < 50:
             score -= 0.10  # Very short, possibly snippet
         elif word_count > 300:
@@ -367,38 +715,153 @@ class ImprovedTextDetector:
             return None
 
         try:
-            inputs = self.tokenizer(
-                text,
-                return_tensors="pt",
-                truncation=True,
-                max_length=512,
-                padding=True
-            )
-            
-            device = model_loader.get_device()
-            inputs = {k: v.to(device) for k, v in inputs.items()}
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits = outputs.logits
-                probabilities = torch.softmax(logits, dim=-1)
-            
-            probs = probabilities[0].cpu().numpy()
-            
-            # For sentiment model, use confidence as a weak signal
-            # Positive sentiment slightly increases trust, negative decreases
-            confidence = float(max(probs))
-            positive_score = float(probs[1]) if len(probs) > 1 else 0.5
-            
-            # Use cautiously - sentiment != factuality
-            ml_score = 0.50 + (positive_score - 0.5) * 0.3  # Dampened effect
-            
-            return ml_score
+            # Concurrent requests are tokenized and scored together, on a worker thread
+            return await self._batcher.submit(text)
             
         except Exception as e:
             logger.error(f"Local ML analysis error: {e}")
             return None
     
+    async def _analyze_batch_with_ml(self, texts: List[str]) -> List[Optional[float]]:
+        """ML scores for several texts; the local model scores them in one padded forward pass"""
+        if not texts:
+            return []
+        
+        if groq_analyzer.is_available() or not ML_AVAILABLE or not self.is_loaded():
+            # Per-text API calls (with local fallback) run concurrently
+            return await asyncio.gather(*[self._analyze_with_ml(text) for text in texts])
+        
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(INFER_POOL, self._predict_local_batch, texts)
+        except Exception as e:
+            logger.error(f"Local ML analysis error: {e}")
+            return [None] * len(texts)
+    
+    def _predict_local_batch(self, texts: List[str]) -> List[float]:
+        """
+        Score texts with the local transformer model (blocking). Texts are
+        grouped by token length and each group runs as one padded forward pass.
+        """
+        if len(texts) == 1 and not self._compiled:
+            # A lone text needs neither length grouping nor padding
+            inputs = self.tokenizer(
+                texts,
+                return_tensors="np" if self._onnx else "pt",
+                truncation=True,
+                max_length=512
+            )
+            return self._predict_padded(inputs)
+        
+        # The fast (Rust) tokenizer encodes the whole batch in parallel
+        encodings = self.tokenizer(texts, truncation=True, max_length=512)
+        
+        groups = {}
+        for i, ids in enumerate(encodings['input_ids']):
+            bucket = next((b for b in self.LENGTH_BUCKETS if len(ids) <= b), self.LENGTH_BUCKETS[-1])
+            groups.setdefault(bucket, []).append(i)
+        
+        scores = [None] * len(texts)
+        for bucket, indices in groups.items():
+            # A compiled model pads to the bucket so only the warmed-up lengths occur
+            inputs = self.tokenizer.pad(
+                {k: [encodings[k][i] for i in indices] for k in encodings.keys()},
+                padding='max_length' if self._compiled else 'longest',
+                max_length=bucket if self._compiled else None,
+                return_tensors="np" if self._onnx else "pt"
+            )
+            if self._compiled:
+                inputs = self._pad_rows(inputs)
+            for i, score in zip(indices, self._predict_padded(inputs)[:len(indices)]):
+                scores[i] = score
+        
+        return scores
+    
+    def _pad_rows(self, inputs) -> Dict:
+        """
+        Repeat the first row up to a power-of-two batch size, so captured
+        graphs are only recorded for a handful of batch sizes
+        """
+        n = inputs['input_ids'].shape[0]
+        size = 1 << (n - 1).bit_length()
+        if size == n:
+            return inputs
+        return {k: torch.cat([v, v[:1].expand(size - n, -1)]) for k, v in inputs.items()}
+    
+    def _predict_padded(self, inputs) -> List[float]:
+        """One forward pass over an already padded batch"""
+        if self._onnx:
+            return self._predict_onnx(inputs)
+        
+        device = model_loader.get_device()
+        if device == "cuda":
+            inputs = self._to_cuda(inputs)
+        else:
+            inputs = {k: v.to(device) for k, v in inputs.items()}
+        
+        # On CUDA the weights are already float16 (see model_loader)
+        autocast = torch.autocast(
+            device_type="cpu", dtype=torch.bfloat16,
+            enabled=self.CPU_BF16 and device == "cpu"
+        )
+        
+        with torch.inference_mode(), autocast:
+            outputs = self.model(**inputs)
+            logits = outputs.logits
+            # Softmax in float32 regardless of the inference dtype
+            probabilities = torch.softmax(logits.float(), dim=-1)
+        
+        if probabilities.shape[-1] < 2:
+            return [self._ml_score(0.5)] * len(probabilities)
+        
+        # Only the positive-class column is used; copy N scalars back instead
+        # of the N x num_classes matrix
+        return [self._ml_score(p) for p in probabilities[:, 1].tolist()]
+    
+    def _to_cuda(self, inputs: Dict) -> Dict:
+        """
+        Copy tokenized inputs to the GPU from pinned memory on a side stream,
+        so the transfer can overlap with a forward pass still running on the
+        compute stream
+        """
+        stream = getattr(self._copy_streams, 'stream', None)
+        if stream is None:
+            stream = self._copy_streams.stream = torch.cuda.Stream()
+        
+        with torch.cuda.stream(stream):
+            moved = {k: v.pin_memory().to("cuda", non_blocking=True) for k, v in inputs.items()}
+        
+        compute = torch.cuda.current_stream()
+        compute.wait_stream(stream)
+        for tensor in moved.values():
+            # Allocated on the copy stream but consumed on the compute stream
+            tensor.record_stream(compute)
+        return moved
+    
+    def _predict_onnx(self, inputs) -> List[float]:
+        """Score a tokenized batch with the ONNX Runtime session"""
+        feed = {
+            arg.name: inputs[arg.name].astype(np.int64)
+            for arg in self.model.get_inputs()
+        }
+        logits = self.model.run(None, feed)[0].astype(np.float32)
+        
+        shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        probabilities = shifted / shifted.sum(axis=-1, keepdims=True)
+        if probabilities.shape[-1] < 2:
+            return [self._ml_score(0.5)] * len(probabilities)
+        return [self._ml_score(p) for p in probabilities[:, 1].tolist()]
+    
+    def _ml_score(self, positive_score: float) -> float:
+        """Map the positive-class probability for one text to an ML score"""
+        # For sentiment model, use confidence as a weak signal
+        # Positive sentiment slightly increases trust, negative decreases
+        
+        # Use cautiously - sentiment != factuality
+        ml_score = 0.50 + (positive_score - 0.5) * 0.3  # Dampened effect
+        
+        return ml_score
+    
     def _combine_scores(
         self, 
         domain_trust: Optional[float],
@@ -410,48 +873,43 @@ class ImprovedTextDetector:
         """
         Intelligently combine multiple signals
         """
-        # If highly trusted domain, heavily weight it
-        if domain_trust and domain_trust >= 0.92:
-            logger.info(f"High trust domain detected: {domain_trust}")
-            # 70% domain, 30% content analysis
-            content_score = linguistic_score + metadata_score
-            if ml_score:
-                content_score = (content_score + ml_score) / 2
-            return domain_trust * 0.70 + content_score * 0.30
-        
-        # If known unreliable domain, cap the maximum score
-        if domain_trust and domain_trust < 0.30:
-            logger.warning(f"Unreliable domain detected: {domain_trust}")
-            # Cap at 0.45 regardless of content
-            content_score = linguistic_score + metadata_score
-            if ml_score:
-                content_score = (content_score + ml_score) / 2
-            return min(0.45, max(domain_trust, content_score * 0.60 + domain_trust * 0.40))
-        
-        # If moderately trusted domain (0.75-0.91)
-        if domain_trust and 0.75 <= domain_trust < 0.92:
-            logger.info(f"Trusted domain: {domain_trust}")
-            # 55% domain, 45% content
+        if domain_trust:
+            # Content signals, averaged with the model when it gave a score
             content_score = linguistic_score + metadata_score
             if ml_score:
                 content_score = (content_score + ml_score) / 2
-            return domain_trust * 0.55 + content_score * 0.45
-        
-        # No domain info or neutral domain - rely on content analysis
-        scores = [linguistic_score, metadata_score]
-        weights = [0.60, 0.20]  # Linguistic is primary
+            
+            # If highly trusted domain, heavily weight it
+            if domain_trust >= 0.92:
+                logger.info(f"High trust domain detected: {domain_trust}")
+                # 70% domain, 30% content analysis
+                return domain_trust * 0.70 + content_score * 0.30
+            
+            # If known unreliable domain, cap the maximum score
+            if domain_trust < 0.30:
+                logger.warning(f"Unreliable domain detected: {domain_trust}")
+                # Cap at 0.45 regardless of content
+                return min(0.45, max(domain_trust, content_score * 0.60 + domain_trust * 0.40))
+            
+            # If moderately trusted domain (0.75-0.91)
+            if domain_trust >= 0.75:
+                logger.info(f"Trusted domain: {domain_trust}")
+                # 55% domain, 45% content
+                return domain_trust * 0.55 + content_score * 0.45
+        
+        # No domain info or neutral domain - rely on content analysis.
+        # Weights are linguistic 0.60 (primary), metadata 0.20, ML 0.20 and
+        # domain 0.40, renormalized when a domain score is present
+        total = 1.0
+        if domain_trust:
+            total = 0.60 + 0.20 + (0.20 if ml_score else 0.0) + 0.40
         
+        final_score = linguistic_score * (0.60 / total) + metadata_score * (0.20 / total)
         if ml_score:
-            scores.append(ml_score)
-            weights.append(0.20)
-        
+            final_score += ml_score * (0.20 / total)
         if domain_trust:
-            scores.append(domain_trust)
-            weights.append(0.40)
-            # Renormalize weights
-            weights = [w / sum(weights) for w in weights]
+            final_score += domain_trust * (0.40 / total)
         
-        final_score = sum(s * w for s, w in zip(scores, weights))
         return max(0.0, min(1.0, final_score))
     
     def _calculate_confidence(
@@ -478,12 +936,9 @@ class ImprovedTextDetector:
         
         # Check agreement between signals
         if len(available_signals) >= 2:
-            if np:
-                variance = np.var(available_signals)
-            else:
-                # Manual variance calculation if numpy is missing
-                mean = sum(available_signals) / len(available_signals)
-                variance = sum((x - mean) ** 2 for x in available_signals) / len(available_signals)
+            # Plain Python is cheaper than an ndarray round trip for 2-4 values
+            mean = sum(available_signals) / len(available_signals)
+            variance = sum((x - mean) ** 2 for x in available_signals) / len(available_signals)
             
             # Low variance = high agreement = high confidence
             agreement_bonus = max(0, 0.25 - variance)
@@ -521,7 +976,7 @@ class ImprovedTextDetector:
         # Domain analysis
         if domain_trust:
             if domain_trust >= 0.90:
-                domain_name = urlparse(url).netloc if url else "source"
+                domain_name = _parsed_url(url)[0] if url else "source"
                 parts.append(f"Source ({domain_name}) is highly trusted and verified")
             elif domain_trust >= 0.75:
                 parts.append(f"Source has good reputation in journalism")
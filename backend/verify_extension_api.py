@@ -1,8 +1,9 @@
-import requests
+import asyncio
+import httpx
 import json
 import sys
 
-def test_api():
+async def test_api():
     url = "http://localhost:8000/analyze/text"
     payload = {
         "text": "This is a test sentence to verify the Reality Fix extension API is working correctly.",
@@ -11,7 +12,8 @@ def test_api():
     
     print(f"Testing API endpoint: {url}")
     try:
-        response = requests.post(url, json=payload)
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.post(url, json=payload)
         
         print(f"Status Code: {response.status_code}")
         
@@ -40,5 +42,5 @@ def test_api():
         return False
 
 if __name__ == "__main__":
-    success = test_api()
+    success = asyncio.run(test_api())
     sys.exit(0 if success else 1)
@@ -1,117 +1,118 @@
 """
-API Testing Examples
+API Testing Examples (a script against a running server, not a pytest module)
 Run with: python test_api.py
 """
 
-import requests
+import asyncio
+import httpx
 import json
 
 API_BASE_URL = "http://localhost:8000"
+REPORT_POLL_ATTEMPTS = 20
+REPORT_POLL_INTERVAL = 0.25  # seconds
 
-def test_health():
+def describe(response: httpx.Response) -> str:
+    """Status line and pretty-printed body of a response"""
+    return (
+        f"Status: {response.status_code}\n"
+        f"Response: {json.dumps(response.json(), indent=2)}"
+    )
+
+async def check_health(client: httpx.AsyncClient) -> str:
     """Test health check endpoint"""
-    print("\n=== Testing Health Check ===")
-    response = requests.get(f"{API_BASE_URL}/health")
-    print(f"Status: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    response = await client.get("/health")
+    return "\n=== Testing Health Check ===\n" + describe(response)
 
-def test_text_analysis():
+async def check_text_analysis(client: httpx.AsyncClient) -> str:
     """Test text analysis endpoint"""
-    print("\n=== Testing Text Analysis ===")
-    
     # Example 1: Trustworthy text
     text1 = """
-    According to a study published in Nature journal, researchers at MIT have developed 
-    a new method for carbon capture that could reduce atmospheric CO2 levels. The peer-reviewed 
+    According to a study published in Nature journal, researchers at MIT have developed
+    a new method for carbon capture that could reduce atmospheric CO2 levels. The peer-reviewed
     research was conducted over three years with multiple validation studies.
     """
-    
-    response = requests.post(
-        f"{API_BASE_URL}/analyze/text",
-        json={"text": text1}
-    )
-    print(f"Status: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
-    
+
     # Example 2: Suspicious text
     text2 = """
-    SHOCKING discovery! Scientists don't want you to know this secret miracle cure 
-    that will change everything! Click here now before it's too late! This exclusive 
+    SHOCKING discovery! Scientists don't want you to know this secret miracle cure
+    that will change everything! Click here now before it's too late! This exclusive
     leaked information will blow your mind!
     """
-    
-    response = requests.post(
-        f"{API_BASE_URL}/analyze/text",
-        json={"text": text2}
+
+    response1, response2 = await asyncio.gather(
+        client.post("/analyze/text", json={"text": text1}),
+        client.post("/analyze/text", json={"text": text2})
     )
-    print(f"\nSuspicious Text Analysis:")
-    print(f"Status: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
 
-def test_image_analysis():
+    return (
+        "\n=== Testing Text Analysis ===\n" + describe(response1)
+        + "\n\nSuspicious Text Analysis:\n" + describe(response2)
+    )
+
+async def check_image_analysis(client: httpx.AsyncClient) -> str:
     """Test image analysis endpoint"""
-    print("\n=== Testing Image Analysis ===")
-    
     # Example image URL
     image_url = "https://picsum.photos/800/600"
-    
-    response = requests.post(
-        f"{API_BASE_URL}/analyze/image",
-        json={"image_url": image_url}
-    )
-    print(f"Status: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
 
-def test_audio_analysis():
+    response = await client.post("/analyze/image", json={"image_url": image_url})
+    return "\n=== Testing Image Analysis ===\n" + describe(response)
+
+async def check_audio_analysis(client: httpx.AsyncClient) -> str:
     """Test audio analysis endpoint"""
-    print("\n=== Testing Audio Analysis ===")
-    
     # Example audio URL (would need real audio file)
     audio_url = "https://example.com/sample.mp3"
-    
-    response = requests.post(
-        f"{API_BASE_URL}/analyze/audio",
-        json={"audio_url": audio_url}
-    )
-    print(f"Status: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
 
-def test_get_report():
+    response = await client.post("/analyze/audio", json={"audio_url": audio_url})
+    return "\n=== Testing Audio Analysis ===\n" + describe(response)
+
+async def check_get_report(client: httpx.AsyncClient) -> str:
     """Test report retrieval"""
-    print("\n=== Testing Report Retrieval ===")
-    
+    output = "\n=== Testing Report Retrieval ==="
+
     # First create a report
     text = "Sample text for testing report retrieval"
-    response = requests.post(
-        f"{API_BASE_URL}/analyze/text",
-        json={"text": text}
-    )
-    
+    response = await client.post("/analyze/text", json={"text": text})
+
     if response.status_code == 200:
         report_id = response.json()['report_id']
-        print(f"Created report: {report_id}")
-        
-        # Now retrieve it
-        report_response = requests.get(f"{API_BASE_URL}/report/{report_id}")
-        print(f"Status: {report_response.status_code}")
-        print(f"Response: {json.dumps(report_response.json(), indent=2)}")
+        output += f"\nCreated report: {report_id}"
+
+        # Now retrieve it; the report is saved after the response is sent,
+        # so allow it a few seconds to appear
+        for _ in range(REPORT_POLL_ATTEMPTS):
+            report_response = await client.get(f"/report/{report_id}")
+            if report_response.status_code != 404:
+                break
+            await asyncio.sleep(REPORT_POLL_INTERVAL)
+        output += "\n" + describe(report_response)
+
+    return output
+
+async def main():
+    # One client for every call: connections are kept alive and reused
+    async with httpx.AsyncClient(base_url=API_BASE_URL, http2=True, timeout=30.0) as client:
+        # Independent tests run concurrently; output is printed in order
+        return await asyncio.gather(
+            check_health(client),
+            check_text_analysis(client),
+            check_image_analysis(client),
+            # check_audio_analysis(client),  # Uncomment when audio URL is available
+            check_get_report(client)
+        )
 
 if __name__ == "__main__":
     print("RealityFix API Testing")
     print("=" * 50)
-    
+
     try:
-        test_health()
-        test_text_analysis()
-        test_image_analysis()
-        # test_audio_analysis()  # Uncomment when audio URL is available
-        test_get_report()
-        
+        for output in asyncio.run(main()):
+            print(output)
+
         print("\n" + "=" * 50)
         print("Testing completed!")
-        
-    except requests.exceptions.ConnectionError:
+
+    except httpx.ConnectError:
         print("\nError: Could not connect to API.")
         print("Make sure the backend is running: python backend/app.py")
     except Exception as e:
-        print(f"\nError during testing: {e}")
\ No newline at end of file
+        print(f"\nError during testing: {e}")